@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks de la génération et de l'envoi SFTP (hors Streamlit).
+"""
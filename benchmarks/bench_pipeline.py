@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de la chaîne génération OU_EXP + envoi SFTP.
+
+Exports BOSS synthétiques (1k / 10k / 100k commandes, nombre de lignes de
+détail variable), génération chronométrée pour chaque mode_etat avec et
+sans ligne partielle, puis débit d'envoi vers un serveur SFTP local.
+Résultats en JSON pour suivre les régressions d'un run à l'autre.
+
+    python -m benchmarks.bench_pipeline --sizes 1000 10000 --output bench.json
+"""
+
+import argparse
+import csv
+import json
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from io import BytesIO, StringIO
+
+import pandas as pd
+
+from core.generation import iter_csv_par_commande
+from core.referentiel import ETATS, TRANSPORTEURS
+from core.sftp import get_pool, upload_parallel
+from core.source import lire_source
+
+MODES = ["unique", "cyclique", "aleatoire"]
+CODES = [f"MI{n:06d}" for n in range(5000)]
+LIBELLES = ["Tuyau PVC 3m", "Vanne 1/4 tour", "Raccord laiton", "Collier inox", "Joint fibre ø20"]
+
+
+# =============================
+# Export BOSS synthétique
+# =============================
+def export_synthetique(nb_commandes, lignes_max, seed=0):
+    """
+    CSV BOSS (bytes utf-8) : `nb_commandes` lignes, 1 à `lignes_max` détails pipe.
+    """
+    rng = random.Random(seed)
+    out = StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["Reference", "Date de validation", "Quantité", "prixUnitHt",
+                     "prixAchatHt", "Code Mistral", "Libellé"])
+    for i in range(nb_commandes):
+        n = rng.randint(1, lignes_max)
+        writer.writerow([
+            str(4700000 + i),
+            "2025-10-23",
+            "|".join(str(rng.randint(1, 6)) for _ in range(n)),
+            "|".join(str(rng.randint(100, 99999)) for _ in range(n)),
+            "|".join(str(rng.randint(50, 50000)) for _ in range(n)),
+            "|".join(rng.choice(CODES) for _ in range(n)),
+            "|".join(rng.choice(LIBELLES) for _ in range(n)),
+        ])
+    return out.getvalue().encode("utf-8")
+
+
+# =============================
+# Mesures
+# =============================
+def mesurer_lecture(data):
+    t0 = time.perf_counter()
+    df = lire_source(BytesIO(data))
+    return df, time.perf_counter() - t0
+
+
+def mesurer_generation(df, mode_etat, partiel_active, processus=1):
+    nb_fichiers = 0
+    nb_octets = 0
+    t0 = time.perf_counter()
+    for _, buffer in iter_csv_par_commande(
+        df, etats=ETATS, transporteurs=TRANSPORTEURS, mode_etat=mode_etat,
+        partiel_active=partiel_active, partiel_qte=1, processus=processus, graine=0
+    ):
+        nb_fichiers += 1
+        nb_octets += len(buffer.getvalue())
+    duree = time.perf_counter() - t0
+    return {
+        "mode_etat": mode_etat,
+        "partiel_active": partiel_active,
+        "processes": processus,
+        "files": nb_fichiers,
+        "bytes": nb_octets,
+        "seconds": round(duree, 4),
+        "files_per_s": round(nb_fichiers / duree, 1) if duree else None,
+    }
+
+
+def mesurer_upload(fichiers, sftp_cfg, concurrency):
+    pool = get_pool(sftp_cfg)
+    nb_octets = sum(len(buffer.getvalue()) for _, buffer in fichiers)
+    t0 = time.perf_counter()
+    erreurs = sum(
+        erreur is not None
+        for _, _, erreur in upload_parallel(pool, fichiers, sftp_cfg["dir"], concurrency=concurrency)
+    )
+    duree = time.perf_counter() - t0
+    return {
+        "concurrency": concurrency,
+        "files": len(fichiers),
+        "errors": erreurs,
+        "bytes": nb_octets,
+        "seconds": round(duree, 4),
+        "files_per_s": round(len(fichiers) / duree, 1) if duree else None,
+        "mb_per_s": round(nb_octets / duree / 1e6, 3) if duree else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def run(sizes, lignes, upload_files, concurrencies, processes=(1,)):
+    resultats = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+        },
+        "generation": [],
+        "upload": [],
+    }
+
+    for nb_commandes in sizes:
+        for lignes_max in lignes:
+            data = export_synthetique(nb_commandes, lignes_max)
+            df, duree_lecture = mesurer_lecture(data)
+            base = {"orders": nb_commandes, "max_lines": lignes_max,
+                    "source_bytes": len(data), "read_seconds": round(duree_lecture, 4)}
+            for mode_etat in MODES:
+                for partiel_active in (False, True):
+                    for processus in processes:
+                        r = mesurer_generation(df, mode_etat, partiel_active, processus)
+                        resultats["generation"].append({**base, **r})
+                        print(f"[gen] {nb_commandes} cmd x{lignes_max} {mode_etat:<9} "
+                              f"partiel={partiel_active!s:<5} p={processus} {r['seconds']:.3f}s",
+                              file=sys.stderr)
+
+    if upload_files:
+        # Import local : paramiko (serveur) n'est nécessaire que pour cette partie
+        from benchmarks.sftp_stub import SFTPStub
+
+        data = export_synthetique(upload_files, 3)
+        fichiers = list(iter_csv_par_commande(
+            lire_source(BytesIO(data)), etats=ETATS, transporteurs=TRANSPORTEURS, mode_etat="cyclique"
+        ))
+        root = tempfile.mkdtemp(prefix="bench_sftp_")
+        stub = SFTPStub(root)
+        try:
+            for concurrency in concurrencies:
+                cfg = stub.sftp_cfg(f"refonteTest_c{concurrency}", max_sessions=concurrency)
+                r = mesurer_upload(fichiers, cfg, concurrency)
+                resultats["upload"].append(r)
+                print(f"[upload] concurrency={concurrency} {r['files_per_s']} fichiers/s", file=sys.stderr)
+        finally:
+            stub.close()
+            shutil.rmtree(root, ignore_errors=True)
+
+    return resultats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="nombres de commandes des exports synthétiques")
+    parser.add_argument("--lines", type=int, nargs="+", default=[1, 5],
+                        help="nombre max de lignes de détail par commande")
+    parser.add_argument("--upload-files", type=int, default=1000,
+                        help="fichiers envoyés au serveur SFTP local (0 = pas de mesure d'envoi)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4],
+                        help="niveaux de parallélisme testés pour l'envoi")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1],
+                        help="nombres de processus testés pour la génération")
+    parser.add_argument("--output", help="fichier JSON de sortie (défaut : stdout)")
+    args = parser.parse_args(argv)
+
+    resultats = run(args.sizes, args.lines, args.upload_files, args.concurrency, args.processes)
+    texte = json.dumps(resultats, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(texte + "\n")
+    else:
+        print(texte)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark des profils de réglage SSH (core.sftp.PROFILS_SSH).
+
+Pour chaque profil : envoi d'un lot de CSV OU_EXP synthétiques (texte très
+compressible) et d'un gros PDF simulé (peu compressible) vers le serveur
+SFTP local, à travers un relais TCP qui ajoute une latence et limite le
+débit, comme le lien vers le serveur BOSS. Relève le débit utile et les
+octets réellement passés sur le réseau (effet de la compression).
+
+    python -m benchmarks.bench_ssh --latency-ms 40 --bandwidth-mbit 20 --output ssh.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from io import BytesIO
+
+from benchmarks.bench_pipeline import _git_commit, export_synthetique
+from benchmarks.sftp_stub import SFTPStub
+from core.generation import iter_csv_par_commande
+from core.referentiel import ETATS, TRANSPORTEURS
+from core.sftp import PROFILS_SSH, SFTPPool, envoyer_flux, upload_parallel
+from core.source import lire_source
+
+
+# =============================
+# Relais TCP : latence + débit limité
+# =============================
+class RelaisLent:
+    """
+    Relais 127.0.0.1:port -> serveur, qui retarde chaque paquet de `latence`
+    secondes dans chaque sens (sans bloquer les suivants : le délai est
+    pipeliné, comme sur un vrai lien) et limite le débit à `debit` octets/s.
+    Compte les octets relayés (ce qui passe réellement sur le réseau).
+    """
+
+    def __init__(self, port_serveur, latence=0.0, debit=None):
+        self.port_serveur = port_serveur
+        self.latence = latence
+        self.debit = debit
+        self.octets = 0
+        self._lock = threading.Lock()
+        self._sock = socket.socket()
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(50)
+        self.port = self._sock.getsockname()[1]
+        threading.Thread(target=self._accepter, daemon=True).start()
+
+    def _accepter(self):
+        while True:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return
+            serveur = socket.create_connection(("127.0.0.1", self.port_serveur))
+            for a, b in ((client, serveur), (serveur, client)):
+                file = deque()
+                signal = threading.Condition()
+                threading.Thread(target=self._lire, args=(a, file, signal), daemon=True).start()
+                threading.Thread(target=self._ecrire, args=(b, file, signal), daemon=True).start()
+
+    def _lire(self, source, file, signal):
+        while True:
+            try:
+                data = source.recv(65536)
+            except OSError:
+                data = b""
+            with signal:
+                file.append((time.perf_counter() + self.latence, data))
+                signal.notify()
+            if not data:
+                return
+
+    def _ecrire(self, cible, file, signal):
+        while True:
+            with signal:
+                while not file:
+                    signal.wait()
+                echeance, data = file.popleft()
+            attente = echeance - time.perf_counter()
+            if attente > 0:
+                time.sleep(attente)
+            if not data:
+                try:
+                    cible.shutdown(socket.SHUT_WR)
+                except OSError:
+                    pass
+                return
+            if self.debit:
+                time.sleep(len(data) / self.debit)
+            try:
+                cible.sendall(data)
+            except OSError:
+                return
+            with self._lock:
+                self.octets += len(data)
+
+    def close(self):
+        self._sock.close()
+
+
+# =============================
+# Mesures
+# =============================
+def _pool(relais, profil):
+    return SFTPPool("127.0.0.1", "bench", "bench", max_sessions=4, port=relais.port, ssh=PROFILS_SSH[profil])
+
+
+def mesurer_csv(relais, profil, fichiers, dir_remote, concurrency):
+    pool = _pool(relais, profil)
+    try:
+        with pool.session():
+            pass  # connexion hors mesure
+        nb_octets = sum(len(buffer.getvalue()) for _, buffer in fichiers)
+        avant = relais.octets
+        t0 = time.perf_counter()
+        erreurs = sum(
+            erreur is not None
+            for _, _, erreur in upload_parallel(pool, fichiers, dir_remote, concurrency=concurrency)
+        )
+        duree = time.perf_counter() - t0
+        reseau = relais.octets - avant
+    finally:
+        pool.close_all()
+    return {
+        "profile": profil,
+        "payload": "csv",
+        "files": len(fichiers),
+        "errors": erreurs,
+        "bytes": nb_octets,
+        "wire_bytes": reseau,
+        "seconds": round(duree, 4),
+        "files_per_s": round(len(fichiers) / duree, 1) if duree else None,
+        "mb_per_s": round(nb_octets / duree / 1e6, 3) if duree else None,
+    }
+
+
+def mesurer_pdf(relais, profil, pdf, dir_remote):
+    pool = _pool(relais, profil)
+    try:
+        with pool.session() as sftp:
+            avant = relais.octets
+            t0 = time.perf_counter()
+            envoyer_flux(sftp, BytesIO(pdf), f"{dir_remote}/FACT_BENCH_{profil}.pdf")
+            duree = time.perf_counter() - t0
+            reseau = relais.octets - avant
+    finally:
+        pool.close_all()
+    return {
+        "profile": profil,
+        "payload": "pdf",
+        "files": 1,
+        "errors": 0,
+        "bytes": len(pdf),
+        "wire_bytes": reseau,
+        "seconds": round(duree, 4),
+        "files_per_s": None,
+        "mb_per_s": round(len(pdf) / duree / 1e6, 3) if duree else None,
+    }
+
+
+def pdf_synthetique(taille, seed=0):
+    # Flux PDF déjà compressés : contenu quasi aléatoire
+    rng = random.Random(seed)
+    return b"%PDF-1.7\n" + rng.randbytes(taille)
+
+
+def run(profils, csv_files, pdf_mb, latence_ms, debit_mbit, concurrency):
+    resultats = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "latency_ms": latence_ms,
+            "bandwidth_mbit": debit_mbit,
+            "concurrency": concurrency,
+        },
+        "runs": [],
+    }
+    fichiers = list(iter_csv_par_commande(
+        lire_source(BytesIO(export_synthetique(csv_files, 3))),
+        etats=ETATS, transporteurs=TRANSPORTEURS, mode_etat="cyclique"
+    )) if csv_files else []
+    pdf = pdf_synthetique(int(pdf_mb * 1024 * 1024)) if pdf_mb else None
+
+    root = tempfile.mkdtemp(prefix="bench_ssh_")
+    stub = SFTPStub(root)
+    relais = RelaisLent(stub.port, latence_ms / 2000, debit_mbit * 125_000 if debit_mbit else None)
+    try:
+        for profil in profils:
+            dir_remote = stub.sftp_cfg(f"refonteTest_{profil}")["dir"]
+            if fichiers:
+                r = mesurer_csv(relais, profil, fichiers, dir_remote, concurrency)
+                resultats["runs"].append(r)
+                print(f"[csv] {profil:<8} {r['files_per_s']} fichiers/s, "
+                      f"{r['wire_bytes'] / max(r['bytes'], 1):.2f} octet réseau/octet", file=sys.stderr)
+            if pdf is not None:
+                r = mesurer_pdf(relais, profil, pdf, dir_remote)
+                resultats["runs"].append(r)
+                print(f"[pdf] {profil:<8} {r['mb_per_s']} Mo/s", file=sys.stderr)
+    finally:
+        relais.close()
+        stub.close()
+        shutil.rmtree(root, ignore_errors=True)
+    return resultats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILS_SSH), default=list(PROFILS_SSH),
+                        help="profils comparés")
+    parser.add_argument("--csv-files", type=int, default=500, help="fichiers OU_EXP du lot (0 = pas de lot)")
+    parser.add_argument("--pdf-mb", type=float, default=20, help="taille du PDF en Mo (0 = pas de PDF)")
+    parser.add_argument("--latency-ms", type=float, default=40, help="aller-retour ajouté par le relais")
+    parser.add_argument("--bandwidth-mbit", type=float, default=20, help="débit du relais (0 = illimité)")
+    parser.add_argument("--concurrency", type=int, default=4, help="envois simultanés pour le lot CSV")
+    parser.add_argument("--output", help="fichier JSON de sortie (défaut : stdout)")
+    args = parser.parse_args(argv)
+
+    resultats = run(args.profiles, args.csv_files, args.pdf_mb, args.latency_ms,
+                    args.bandwidth_mbit, args.concurrency)
+    texte = json.dumps(resultats, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(texte + "\n")
+    else:
+        print(texte)
+
+
+if __name__ == "__main__":
+    main()
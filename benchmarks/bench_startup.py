@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark du démarrage à froid des pages Streamlit.
+
+Chaque mesure part d'un interpréteur neuf : import de streamlit, puis
+premier rendu de la page (AppTest, sans fichier chargé ni clic), comme au
+premier affichage après démarrage du conteneur. Relève aussi les dépendances
+lourdes chargées par ce premier rendu. `--baseline` mesure la même chose sur
+une autre révision git pour chiffrer le gain.
+
+    python -m benchmarks.bench_startup --baseline HEAD~1 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+PAGES = ["app.py", "pages/1_envoi_etats_de_commande.py", "pages/2_envoi_facture.py"]
+LOURDS = ["pandas", "numpy", "pyarrow", "paramiko", "requests"]
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Exécuté dans un interpréteur neuf : argv = [page, dépendances lourdes...]
+_MESURE = """
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+t1 = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+t2 = time.perf_counter()
+print(json.dumps({
+    "import_streamlit": t1 - t0,
+    "first_run": t2 - t1,
+    "exception": bool(at.exception),
+    "modules": [m for m in sys.argv[2:] if m in sys.modules],
+}))
+"""
+
+
+def _git_commit(rev="HEAD"):
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", rev], capture_output=True, text=True,
+                              cwd=RACINE, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _extraire(rev):
+    """
+    Copie de l'arbre à la révision `rev` dans un dossier temporaire.
+    """
+    dossier = tempfile.mkdtemp(prefix="bench_startup_")
+    archive = subprocess.run(["git", "archive", rev], capture_output=True, cwd=RACINE, check=True).stdout
+    subprocess.run(["tar", "-x", "-C", dossier], input=archive, check=True)
+    return dossier
+
+
+def mesurer_page(racine, page, repeat):
+    """
+    Médianes sur `repeat` démarrages à froid de la page.
+    """
+    env = dict(os.environ, PYTHONPATH=racine)
+    runs = []
+    for _ in range(repeat):
+        debut = time.perf_counter()
+        sortie = subprocess.run(
+            [sys.executable, "-c", _MESURE, os.path.join(racine, page), *LOURDS],
+            capture_output=True, text=True, cwd=racine, env=env, check=True
+        ).stdout
+        total = time.perf_counter() - debut
+        runs.append({**json.loads(sortie.strip().splitlines()[-1]), "process": total})
+    return {
+        "page": page,
+        "process_seconds": round(statistics.median(r["process"] for r in runs), 4),
+        "import_streamlit_seconds": round(statistics.median(r["import_streamlit"] for r in runs), 4),
+        "first_run_seconds": round(statistics.median(r["first_run"] for r in runs), 4),
+        "exception": any(r["exception"] for r in runs),
+        "heavy_modules": runs[-1]["modules"],
+    }
+
+
+def run(repeat, baseline=None, pages=PAGES):
+    resultats = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "repeat": repeat,
+        },
+        "current": [],
+    }
+    for page in pages:
+        r = mesurer_page(RACINE, page, repeat)
+        resultats["current"].append(r)
+        print(f"[startup] {page:<40} {r['first_run_seconds']:.3f}s {r['heavy_modules']}", file=sys.stderr)
+
+    if baseline:
+        resultats["meta"]["baseline"] = _git_commit(baseline)
+        resultats["baseline"] = []
+        dossier = _extraire(baseline)
+        try:
+            for page in pages:
+                if not os.path.exists(os.path.join(dossier, page)):
+                    continue
+                r = mesurer_page(dossier, page, repeat)
+                resultats["baseline"].append(r)
+                print(f"[baseline] {page:<40} {r['first_run_seconds']:.3f}s {r['heavy_modules']}",
+                      file=sys.stderr)
+        finally:
+            shutil.rmtree(dossier, ignore_errors=True)
+    return resultats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="démarrages à froid par page (médiane)")
+    parser.add_argument("--baseline", help="révision git de comparaison (ex : HEAD~1)")
+    parser.add_argument("--pages", nargs="+", default=PAGES, help="scripts mesurés, relatifs à la racine")
+    parser.add_argument("--output", help="fichier JSON de sortie (défaut : stdout)")
+    args = parser.parse_args(argv)
+
+    resultats = run(args.repeat, args.baseline, args.pages)
+    texte = json.dumps(resultats, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(texte + "\n")
+    else:
+        print(texte)
+
+
+if __name__ == "__main__":
+    main()
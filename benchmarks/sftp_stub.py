@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Serveur SFTP minimal en mémoire de processus (paramiko), pour mesurer
+l'envoi sans dépendre du vrai serveur. Les fichiers sont écrits dans un
+répertoire local. Aucune authentification réelle : usage local uniquement.
+"""
+
+import os
+import socket
+import threading
+
+import paramiko
+from paramiko import (
+    AUTH_SUCCESSFUL,
+    OPEN_SUCCEEDED,
+    SFTP_OK,
+    SFTPAttributes,
+    SFTPHandle,
+    SFTPServer,
+    SFTPServerInterface,
+)
+
+
+class _Handle(SFTPHandle):
+    def stat(self):
+        return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+
+def _sftp_interface(root):
+    class _SFTP(SFTPServerInterface):
+        def _local(self, path):
+            return os.path.join(root, path.lstrip("/"))
+
+        def open(self, path, flags, attr):
+            try:
+                fd = os.open(self._local(path), flags, 0o644)
+            except OSError as e:
+                return SFTPServer.convert_errno(e.errno)
+            if flags & os.O_WRONLY:
+                mode = "wb"
+            elif flags & os.O_RDWR:
+                mode = "r+b"
+            else:
+                mode = "rb"
+            f = os.fdopen(fd, mode)
+            handle = _Handle(flags)
+            handle.readfile = f
+            handle.writefile = f
+            return handle
+
+        def stat(self, path):
+            try:
+                return SFTPAttributes.from_stat(os.stat(self._local(path)))
+            except OSError as e:
+                return SFTPServer.convert_errno(e.errno)
+
+        lstat = stat
+
+        def list_folder(self, path):
+            try:
+                out = []
+                for nom in os.listdir(self._local(path)):
+                    attr = SFTPAttributes.from_stat(os.stat(os.path.join(self._local(path), nom)))
+                    attr.filename = nom
+                    out.append(attr)
+                return out
+            except OSError as e:
+                return SFTPServer.convert_errno(e.errno)
+
+        def mkdir(self, path, attr):
+            try:
+                os.mkdir(self._local(path))
+                return SFTP_OK
+            except OSError as e:
+                return SFTPServer.convert_errno(e.errno)
+
+        def remove(self, path):
+            try:
+                os.remove(self._local(path))
+                return SFTP_OK
+            except OSError as e:
+                return SFTPServer.convert_errno(e.errno)
+
+        def rename(self, oldpath, newpath):
+            try:
+                os.rename(self._local(oldpath), self._local(newpath))
+                return SFTP_OK
+            except OSError as e:
+                return SFTPServer.convert_errno(e.errno)
+
+        posix_rename = rename
+
+    return _SFTP
+
+
+class _Server(paramiko.ServerInterface):
+    def check_auth_password(self, username, password):
+        return AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return OPEN_SUCCEEDED
+
+
+class SFTPStub:
+    """
+    Démarre un serveur SFTP sur 127.0.0.1 (port libre) servant `root`.
+    `sftp_cfg` donne une config utilisable par core.sftp.get_pool.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._key = paramiko.RSAKey.generate(2048)
+        self._sock = socket.socket()
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(50)
+        self.port = self._sock.getsockname()[1]
+        self._transports = []
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        interface = _sftp_interface(self.root)
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(self._key)
+            transport.use_compression(True)  # accepte zlib si le client le demande
+            transport.set_subsystem_handler("sftp", SFTPServer, interface)
+            transport.start_server(server=_Server())
+            self._transports.append(transport)
+
+    def sftp_cfg(self, dir_remote="refonteTest", **extra):
+        os.makedirs(os.path.join(self.root, dir_remote), exist_ok=True)
+        cfg = {"host": "127.0.0.1", "port": self.port, "user": "bench", "pass": "bench", "dir": dir_remote}
+        cfg.update(extra)
+        return cfg
+
+    def close(self):
+        self._sock.close()
+        for transport in self._transports:
+            transport.close()
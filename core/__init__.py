@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""
+Code partagé entre les pages Streamlit, utilisable sans Streamlit :
+
+- config      : configuration SFTP (secrets Streamlit ou variables SFTP_*)
+- source      : lecture / cache du fichier source BOSS
+- generation  : génération des fichiers OU_EXP
+- sftp        : pool de sessions, envoi parallèle et atomique
+- pipeline    : chaîne complète d'un lot de commandes
+- lots        : magasin sur disque des lots générés (téléchargements)
+- charge      : test de charge (envoi continu à débit cible)
+- factures    : paires FACT_*.pdf / OU_FACT_* et envoi en lot
+- metrics     : mesures par étape
+"""
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Archive d'un lot de fichiers générés (ZIP ou tar.gz) : téléchargement de
+tout le lot, copie locale, ou envoi SFTP en un seul fichier.
+"""
+
+import os
+import tarfile
+import time
+import zipfile
+from datetime import datetime
+from io import BytesIO
+
+FORMATS = {"zip": ".zip", "tar.gz": ".tar.gz"}
+
+
+class ArchiveLot:
+    def __init__(self, format="zip", prefixe="OU_EXP_LOT", out=None, dossier=None):
+        """
+        out: objet fichier de sortie (BytesIO par défaut) ; dossier : l'archive
+        est écrite directement sur disque, dans dossier/nom.
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Format d'archive inconnu : {format}")
+        self.format = format
+        self.nom = f"{prefixe}_{datetime.now().strftime('%Y%m%d%H%M%S')}{FORMATS[format]}"
+        if out is None and dossier is not None:
+            out = open(os.path.join(dossier, self.nom), "w+b")
+        self.out = out if out is not None else BytesIO()
+        self.nb_fichiers = 0
+        if format == "zip":
+            self._archive = zipfile.ZipFile(self.out, "w", compression=zipfile.ZIP_DEFLATED)
+        else:
+            self._archive = tarfile.open(fileobj=self.out, mode="w:gz")
+
+    def ajouter(self, nom, buffer):
+        # Octets du fichier tels que produits par la génération (pas de recopie)
+        data = buffer.getvalue()
+        if self.format == "zip":
+            self._archive.writestr(nom, data)
+        else:
+            info = tarfile.TarInfo(nom)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._archive.addfile(info, BytesIO(data))
+        self.nb_fichiers += 1
+
+    def tee(self, named_blobs):
+        """
+        Ajoute chaque (nom, BytesIO) à l'archive au passage, sans interrompre le flux.
+        """
+        for nom, buffer in named_blobs:
+            self.ajouter(nom, buffer)
+            yield nom, buffer
+
+    def fermer(self):
+        """
+        Finalise l'archive et renvoie le buffer positionné au début.
+        """
+        self._archive.close()
+        self.out.seek(0)
+        return self.out
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Génération de charge : fichiers OU_EXP envoyés en continu à un débit cible
+(fichiers/s) pendant une durée donnée, pour trouver les limites du dépôt
+SFTP et de l'import MistralRecupCommande avant les pics d'activité.
+
+Les commandes du fichier source sont rejouées en boucle : à chaque passage
+les références sont décalées et les n° de commande continuent, aucun fichier
+n'en écrase un autre. Chaque fichier est visible sous son nom final dès qu'il
+est complet (renommage immédiat, pas de validation groupée) : la cron les
+voit arriver au fil de l'eau, comme en production.
+
+Latence d'un fichier = de l'instant où il aurait dû partir (planning au
+débit cible) à son arrivée sous son nom final : un envoi saturé se voit
+dans la latence au lieu d'être masqué par un débit qui ralentit.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from core.generation import iter_csv_par_commande
+
+DEFAULT_CONCURRENCY = 4         # envois simultanés
+DEFAULT_INTERVALLE = 5.0        # secondes entre deux rapports intermédiaires
+QUANTILES = (50, 95, 99)
+
+
+# =============================
+# Commandes rejouées en boucle
+# =============================
+def _decaler_bloc(bloc, passage, ecart_ref, ecart_index):
+    """
+    Bloc du passage n° `passage` : références numériques décalées de
+    passage x ecart_ref (suffixe "-passage" sinon), index décalé de même.
+    """
+    bloc = bloc.copy()
+    bloc.index = bloc.index + passage * ecart_index
+    if "Reference" in bloc.columns:
+        ref = bloc["Reference"].astype(object)
+        num = pd.to_numeric(ref, errors="coerce")
+        numerique = num.notna() & ref.notna()
+        ref = ref.where(numerique, ref.astype(str).str.replace("|", f"-{passage}|", regex=False) + f"-{passage}")
+        ref[numerique] = (num[numerique].astype("int64") + passage * ecart_ref).astype(str)
+        bloc["Reference"] = ref.where(bloc["Reference"].notna())
+    return bloc
+
+
+def cycler_commandes(blocs_source, nb_passages=None):
+    """
+    Blocs de la source rejoués `nb_passages` fois (sans fin par défaut).
+    blocs_source: fonction sans argument renvoyant un itérable de DataFrames
+    (relu à chaque passage : la source n'est pas gardée en mémoire).
+    """
+    ref_min = ref_max = None
+    index_max = -1
+    passage = 0
+    while nb_passages is None or passage < nb_passages:
+        vide = True
+        for bloc in blocs_source():
+            if len(bloc) == 0:
+                continue
+            vide = False
+            if passage == 0:
+                # Écarts mesurés au 1er passage : plage des références et de l'index
+                num = pd.to_numeric(bloc["Reference"], errors="coerce") if "Reference" in bloc.columns else None
+                if num is not None and num.notna().any():
+                    ref_min = num.min() if ref_min is None else min(ref_min, num.min())
+                    ref_max = num.max() if ref_max is None else max(ref_max, num.max())
+                index_max = max(index_max, int(bloc.index.max()))
+                yield bloc
+            else:
+                ecart_ref = int(ref_max - ref_min + 1) if ref_min is not None else 0
+                yield _decaler_bloc(bloc, passage, ecart_ref, index_max + 1)
+        if vide:
+            return  # source vide : rien à rejouer
+        passage += 1
+
+
+# =============================
+# Suivi (débit, latences)
+# =============================
+def percentiles(valeurs, quantiles=QUANTILES):
+    """
+    {"p50": ..., "p95": ..., "p99": ..., "max": ...} en millisecondes (rang le plus proche).
+    """
+    if not valeurs:
+        return {f"p{q}": None for q in quantiles} | {"max": None}
+    tri = sorted(valeurs)
+    res = {f"p{q}": round(tri[min(len(tri) - 1, max(0, -(-q * len(tri) // 100) - 1))] * 1000, 1)
+           for q in quantiles}
+    res["max"] = round(tri[-1] * 1000, 1)
+    return res
+
+
+class SuiviCharge:
+    def __init__(self, debit):
+        self.debit = debit
+        self.debut = time.perf_counter()
+        self.ok = 0
+        self.erreurs = 0
+        self.derniere_erreur = None
+        self.en_cours = 0
+        self._latences = []         # depuis le début
+        self._fenetre = []          # depuis le dernier rapport
+        self._envois = []
+        self._fenetre_debut = self.debut
+        self._fenetre_ok = 0
+        self._lock = threading.Lock()
+
+    def lancer(self):
+        with self._lock:
+            self.en_cours += 1
+
+    def noter(self, ok, latence, envoi, erreur=None):
+        with self._lock:
+            self.en_cours -= 1
+            if ok:
+                self.ok += 1
+                self._fenetre_ok += 1
+                self._latences.append(latence)
+                self._fenetre.append(latence)
+                self._envois.append(envoi)
+            else:
+                self.erreurs += 1
+                self.derniere_erreur = str(erreur)
+
+    def rapport(self, final=False):
+        """
+        Instantané : débit atteint (global et sur la dernière fenêtre) contre
+        débit cible, latences de la fenêtre (ou de tout le test si `final`).
+        La fenêtre repart de zéro à chaque appel.
+        """
+        maintenant = time.perf_counter()
+        with self._lock:
+            ecoule = maintenant - self.debut
+            fenetre = maintenant - self._fenetre_debut
+            latences = self._latences if final else self._fenetre
+            res = {
+                "seconds": round(ecoule, 1),
+                "target_files_per_s": self.debit,
+                "files_per_s": round(self.ok / ecoule, 2) if ecoule else None,
+                "files_sent": self.ok,
+                "errors": self.erreurs,
+                "in_flight": self.en_cours,
+                "latency_ms": percentiles(latences),
+            }
+            if not final:
+                res["window_files_per_s"] = round(self._fenetre_ok / fenetre, 2) if fenetre else None
+            else:
+                res["upload_ms"] = percentiles(self._envois)
+                res["achieved_ratio"] = round(self.ok / ecoule / self.debit, 3) if ecoule else None
+                if self.derniere_erreur:
+                    res["last_error"] = self.derniere_erreur
+            self._fenetre = []
+            self._fenetre_ok = 0
+            self._fenetre_debut = maintenant
+        return res
+
+
+# =============================
+# Destinations
+# =============================
+def envoyeur_sftp(sftp_cfg, mesures=None):
+    """
+    envoyer_un(nom, buffer) vers le dossier SFTP de la config.
+    """
+    from core.sftp import envoyer_atomique, get_pool, parametres_envoi, verifier_dossier
+
+    parametres = parametres_envoi(sftp_cfg)
+    if parametres is None:
+        raise ValueError("Identifiants SFTP manquants")
+    dir_remote, _, retries = parametres
+    pool = get_pool(sftp_cfg)
+    verifier_dossier(pool, dir_remote, mesures)
+
+    def envoyer_un(nom, buffer):
+        envoyer_atomique(pool, dir_remote, nom, buffer, retries=retries, mesures=mesures)
+    return envoyer_un
+
+
+def envoyeur_dossier(dossier):
+    """
+    envoyer_un(nom, buffer) dans un dossier local (nom temporaire puis os.replace).
+    """
+    os.makedirs(dossier, exist_ok=True)
+
+    def envoyer_un(nom, buffer):
+        temp = os.path.join(dossier, f".{nom}.{threading.get_ident()}.part")
+        with open(temp, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(temp, os.path.join(dossier, nom))
+    return envoyer_un
+
+
+# =============================
+# Boucle de charge
+# =============================
+def generer_charge(fichiers, debit, duree, envoyer_un, concurrency=DEFAULT_CONCURRENCY,
+                   max_pending=None, intervalle=DEFAULT_INTERVALLE, rapport=None, arret=None):
+    """
+    Envoie les (nom, BytesIO) de `fichiers` au rythme de `debit` fichiers/s
+    pendant `duree` secondes (ou jusqu'à épuisement / `arret`, threading.Event).
+    Le fichier n° i est planifié à debut + i / debit ; en retard, il part
+    aussitôt. Au plus `max_pending` fichiers (2 x concurrency par défaut) en
+    attente ou en cours d'envoi : au-delà, la génération attend. Le test
+    s'arrête à l'heure : les fichiers en retard ne sont pas envoyés après coup.
+    rapport: callback(dict) appelé toutes les `intervalle` secondes
+    Renvoie le rapport final (cf. SuiviCharge.rapport).
+    """
+    if debit <= 0:
+        raise ValueError("Le débit cible doit être > 0")
+    concurrency = max(1, concurrency)
+    places = threading.BoundedSemaphore(max_pending or 2 * concurrency)
+    suivi = SuiviCharge(debit)
+    fini = threading.Event()
+
+    def rapporter():
+        while not fini.wait(intervalle):
+            rapport(suivi.rapport())
+
+    def tache(nom, buffer, prevu):
+        t0 = time.perf_counter()
+        try:
+            envoyer_un(nom, buffer)
+        except Exception as e:
+            suivi.noter(False, None, None, f"{nom} ({e})")
+        else:
+            t1 = time.perf_counter()
+            suivi.noter(True, t1 - prevu, t1 - t0)
+        finally:
+            places.release()
+
+    rapporteur = None
+    if rapport is not None:
+        rapporteur = threading.Thread(target=rapporter, daemon=True)
+        rapporteur.start()
+    debut = suivi.debut
+    fin = debut + duree
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="charge") as executor:
+            for i, (nom, buffer) in enumerate(fichiers):
+                prevu = debut + i / debit
+                # Fin à l'heure même en retard : le retard accumulé n'est pas rattrapé après coup
+                if prevu >= fin or time.perf_counter() >= fin or (arret is not None and arret.is_set()):
+                    break
+                attente = prevu - time.perf_counter()
+                if attente > 0:
+                    if arret is not None:
+                        if arret.wait(attente):
+                            break
+                    else:
+                        time.sleep(attente)
+                # File pleine : on attend une place, sans dépasser la fin du test
+                if not places.acquire(timeout=max(0.0, fin - time.perf_counter())):
+                    break
+                suivi.lancer()
+                executor.submit(tache, nom, buffer, prevu)
+    finally:
+        fini.set()
+        if rapporteur is not None:
+            rapporteur.join()
+    return suivi.rapport(final=True)
+
+
+def charge_commandes(blocs_source, options, debit, duree, envoyer_un, **kwargs):
+    """
+    generer_charge sur les commandes de la source rejouées en boucle.
+    options: paramètres de iter_csv_par_commande (nb_max = plafond total de commandes)
+    """
+    fichiers = iter_csv_par_commande(cycler_commandes(blocs_source), **options)
+    return generer_charge(fichiers, debit, duree, envoyer_un, **kwargs)
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Génération + envoi des fichiers OU_EXP en ligne de commande, sans Streamlit
+(lots de nuit sous cron, scripts).
+
+Mêmes options que la page : états, mode d'attribution, ligne partielle,
+transporteurs, nombre max de commandes. La source est un fichier CSV BOSS ou
+un dossier de CSV (traités à la suite, numérotation continue), lue par blocs.
+Sortie en SFTP (secrets .streamlit/secrets.toml ou variables SFTP_*) ou dans
+un dossier local. Statistiques en JSON sur la sortie standard.
+
+    python -m core.cli export.csv --states "En traitement" --carriers Chronopost --mode cyclique
+    python -m core.cli exports/ --carriers Chronopost Geodis --output-dir ./out --stats stats.json
+
+Test de charge (--rate) : les commandes des sources sont rejouées en boucle
+(références décalées, n° de commande qui continuent) et envoyées au fil de
+l'eau au débit demandé pendant --duration secondes ; débit atteint et
+latences (p50 / p95 / p99) affichés sur la sortie d'erreur toutes les
+--report-every secondes, rapport final dans les statistiques.
+
+    python -m core.cli export.csv --carriers Chronopost --rate 20 --duration 600
+
+Code retour : 0 = lot envoyé (ou rien à envoyer), 1 = échec d'envoi ou source
+refusée par --check, 2 = erreur d'usage.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+from datetime import datetime
+
+from core.config import get_sftp_config
+from core.referentiel import ETATS, TRANSPORTEURS
+
+try:
+    import tomllib
+except ImportError:     # Python < 3.11 : secrets.toml ignoré, variables SFTP_* seules
+    tomllib = None
+
+MODES = ["unique", "cyclique", "aleatoire"]
+DEFAULT_SECRETS = os.path.join(".streamlit", "secrets.toml")
+
+
+def lister_sources(chemins):
+    """
+    Fichiers CSV à traiter : fichiers donnés tels quels, dossiers -> *.csv triés.
+    """
+    sources = []
+    for chemin in chemins:
+        if os.path.isdir(chemin):
+            sources.extend(sorted(glob.glob(os.path.join(chemin, "*.csv"))))
+        else:
+            sources.append(chemin)
+    return sources
+
+
+def iter_blocs(sources, chunksize):
+    """
+    Blocs de toutes les sources à la suite. L'index est décalé d'un fichier à
+    l'autre pour rester unique sur tout le lot (historique des envois).
+    """
+    from core.source import iter_source_chunks
+
+    decalage = 0
+    for chemin in sources:
+        fin = decalage
+        with open(chemin, "rb") as f:
+            for bloc in iter_source_chunks(f, chunksize):
+                if len(bloc):
+                    bloc.index = bloc.index + decalage
+                    fin = int(bloc.index[-1]) + 1
+                yield bloc
+        decalage = fin
+
+
+def controler_sources(sources, chunksize):
+    """
+    core.source.valider_source sur chaque fichier. Renvoie (ok, {chemin: rapport}).
+    """
+    from core.source import valider_source
+
+    rapports = {}
+    for chemin in sources:
+        with open(chemin, "rb") as f:
+            rapports[chemin] = valider_source(f, chunksize)
+    return all(r["ok"] for r in rapports.values()), rapports
+
+
+def charger_secrets(chemin):
+    if tomllib is None or not chemin or not os.path.exists(chemin):
+        return None
+    with open(chemin, "rb") as f:
+        return tomllib.load(f)
+
+
+def parser_arguments(argv=None):
+    noms_transporteurs = [t["nom"] for t in TRANSPORTEURS]
+    parser = argparse.ArgumentParser(
+        prog="python -m core.cli", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("sources", nargs="+", help="fichier(s) CSV BOSS ou dossier(s) de CSV")
+    parser.add_argument("--states", nargs="+", choices=ETATS, default=[ETATS[0]], metavar="ETAT",
+                        help=f"états de commande (défaut : {ETATS[0]!r}) ; choix : {', '.join(ETATS)}")
+    parser.add_argument("--mode", choices=MODES, default="unique", help="attribution des états")
+    parser.add_argument("--carriers", nargs="+", choices=noms_transporteurs, required=True, metavar="NOM",
+                        help=f"transporteurs ; choix : {', '.join(noms_transporteurs)}")
+    parser.add_argument("--nb-max", type=int, default=0, help="nombre max de commandes (0 = toutes)")
+    parser.add_argument("--seed", type=int, help="graine du mode aleatoire (lancements reproductibles)")
+    parser.add_argument("--partial-qty", type=int, default=0,
+                        help="active la ligne partielle avec cette quantité pour la partie A")
+    parser.add_argument("--partial-states", nargs=2, choices=ETATS, metavar=("ETAT_A", "ETAT_B"),
+                        help="états de la partie partielle (A) et du reliquat (B)")
+    parser.add_argument("--processes", type=int, default=1, help="processus pour la génération")
+    parser.add_argument("--chunksize", type=int, default=None, help="lignes source lues par bloc")
+    parser.add_argument("--archive", choices=["zip", "tar.gz"], help="archive de tout le lot")
+    parser.add_argument("--archive-only", action="store_true",
+                        help="n'envoyer que l'archive (un seul fichier)")
+    parser.add_argument("--archive-dir", default=".", help="dossier où écrire l'archive (défaut : .)")
+    parser.add_argument("--delta", action="store_true",
+                        help="uniquement les commandes nouvelles ou modifiées depuis le dernier envoi")
+    parser.add_argument("--check", action="store_true",
+                        help="contrôler les sources avant envoi, et ne rien envoyer en cas d'anomalie")
+    parser.add_argument("--output-dir", help="écrire dans ce dossier local au lieu d'envoyer en SFTP")
+    parser.add_argument("--secrets", default=DEFAULT_SECRETS,
+                        help="secrets.toml contenant la section [sftp] (sinon variables SFTP_*)")
+    parser.add_argument("--stats", help="fichier JSON des statistiques (défaut : sortie standard)")
+    charge = parser.add_argument_group("test de charge")
+    charge.add_argument("--rate", type=float,
+                        help="fichiers/s à tenir : envoi continu des sources rejouées en boucle")
+    charge.add_argument("--duration", type=float, default=60, help="durée du test en secondes (défaut : 60)")
+    charge.add_argument("--concurrency", type=int,
+                        help="envois simultanés (défaut : concurrency de la config, sinon 4)")
+    charge.add_argument("--report-every", type=float, default=5,
+                        help="secondes entre deux rapports intermédiaires (défaut : 5)")
+    args = parser.parse_args(argv)
+
+    if args.archive_only and not args.archive:
+        parser.error("--archive-only nécessite --archive")
+    if args.partial_qty < 0 or args.nb_max < 0 or args.processes < 1:
+        parser.error("--partial-qty, --nb-max >= 0 et --processes >= 1")
+    if args.rate is not None:
+        if args.rate <= 0 or args.duration <= 0 or args.report_every <= 0:
+            parser.error("--rate, --duration et --report-every doivent être > 0")
+        if args.archive or args.delta:
+            parser.error("--rate ne se combine pas avec --archive ni --delta")
+    args.sources = lister_sources(args.sources)
+    manquants = [s for s in args.sources if not os.path.isfile(s)]
+    if not args.sources or manquants:
+        parser.error(f"source introuvable : {', '.join(manquants) or 'aucun fichier CSV'}")
+    return args
+
+
+def executer_charge(args, options, sftp_cfg, chunksize, stats):
+    """
+    Test de charge (--rate) : cf. core.charge. Renvoie (code retour, stats).
+    """
+    from core.charge import DEFAULT_CONCURRENCY, charge_commandes, envoyeur_dossier, envoyeur_sftp
+
+    try:
+        envoyer_un = envoyeur_dossier(args.output_dir) if args.output_dir else envoyeur_sftp(sftp_cfg)
+    except Exception as e:
+        stats.update(ok=False, empty=False, msg=str(e))
+        return 1, stats
+
+    def rapport(r):
+        rapports.append(r)
+        lat = r["latency_ms"]
+        print(
+            f"[charge] {r['seconds']:>7.1f} s  {r['window_files_per_s']} / {args.rate} fichiers/s  "
+            f"latence p50={lat['p50']} p95={lat['p95']} p99={lat['p99']} ms  "
+            f"en vol={r['in_flight']}  erreurs={r['errors']}",
+            file=sys.stderr
+        )
+
+    rapports = []
+    final = charge_commandes(
+        lambda: iter_blocs(args.sources, chunksize), options, args.rate, args.duration, envoyer_un,
+        concurrency=args.concurrency or int(sftp_cfg.get("concurrency") or DEFAULT_CONCURRENCY),
+        intervalle=args.report_every,
+        rapport=rapport,
+    )
+    msg = (
+        f"Test de charge : {final['files_sent']} fichier(s) en {final['seconds']} s, "
+        f"{final['files_per_s']} fichiers/s pour {args.rate} visés ({final['achieved_ratio']:.0%}), "
+        f"latence p95 {final['latency_ms']['p95']} ms"
+    )
+    if final["errors"]:
+        msg += f", {final['errors']} échec(s) (dernier : {final.get('last_error')})"
+    stats.update(
+        ok=final["errors"] == 0,
+        empty=final["files_sent"] == 0 and final["errors"] == 0,
+        msg=msg,
+        load=final,
+        reports=rapports,
+    )
+    return (0 if stats["ok"] else 1), stats
+
+
+def executer(args):
+    """
+    Lance le lot décrit par `args` (cf. parser_arguments). Renvoie (code retour, stats).
+    """
+    from core.pipeline import envoyer_commandes
+    from core.source import DEFAULT_CHUNKSIZE, resume_validation
+    from core.sftp import cible_sftp
+
+    sftp_cfg = get_sftp_config(charger_secrets(args.secrets))
+    chunksize = args.chunksize or DEFAULT_CHUNKSIZE
+    destination = args.output_dir or cible_sftp(sftp_cfg)
+    stats = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "sources": args.sources,
+        "destination": destination,
+    }
+
+    if args.check:
+        ok, rapports = controler_sources(args.sources, chunksize)
+        stats["validation"] = rapports
+        if not ok:
+            problemes = [f"{chemin} : {m}" for chemin, r in rapports.items() for m in resume_validation(r)]
+            stats.update(ok=False, empty=False, msg="Source(s) refusée(s), rien envoyé — " + " ; ".join(problemes))
+            return 1, stats
+
+    # Comme la page : A = 1er état choisi, B = 2e (ou le 1er s'il est seul)
+    partiel_a, partiel_b = args.partial_states or (args.states[0], args.states[1 if len(args.states) > 1 else 0])
+    options = dict(
+        etats=args.states,
+        transporteurs=[t for t in TRANSPORTEURS if t["nom"] in args.carriers],
+        mode_etat=args.mode,
+        nb_max=args.nb_max or None,
+        partiel_active=args.partial_qty > 0,
+        partiel_qte=args.partial_qty or 1,
+        partiel_etat_a=partiel_a,
+        partiel_etat_b=partiel_b,
+        processus=args.processes,
+        graine=args.seed,
+    )
+    if args.rate is not None:
+        return executer_charge(args, options, sftp_cfg, chunksize, stats)
+
+    historique = None
+    if args.delta:
+        from core.historique import HistoriqueEnvois
+        cible = os.path.abspath(args.output_dir) if args.output_dir else destination
+        historique = HistoriqueEnvois(cible=cible)
+
+    if args.archive:
+        os.makedirs(args.archive_dir, exist_ok=True)
+    resultat = envoyer_commandes(
+        iter_blocs(args.sources, chunksize), options, sftp_cfg,
+        archive_format=args.archive,
+        archive_seule=args.archive_only,
+        historique=historique,
+        dossier=args.output_dir,
+        archive_dossier=args.archive_dir if args.archive else None,
+        nom_mesures="cli",
+    )
+
+    archive = None
+    if resultat.get("archive") is not None:
+        nom, out = resultat["archive"]
+        out.close()
+        archive = os.path.join(args.archive_dir, nom)
+    stats.update(
+        ok=bool(resultat["ok"]),
+        empty=bool(resultat.get("vide")),
+        msg=resultat["msg"],
+        archive=archive,
+        perf=resultat.get("perf"),
+    )
+    if resultat.get("avertissement"):
+        stats["warning"] = resultat["avertissement"]
+    return (0 if stats["ok"] or stats["empty"] else 1), stats
+
+
+def main(argv=None):
+    args = parser_arguments(argv)
+    code, stats = executer(args)
+    texte = json.dumps(stats, indent=2, ensure_ascii=False)
+    if args.stats:
+        with open(args.stats, "w", encoding="utf-8") as f:
+            f.write(texte + "\n")
+    else:
+        print(texte)
+    print(stats["msg"], file=sys.stderr)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Configuration SFTP commune aux pages (et aux usages hors Streamlit).
+
+Section [sftp] des secrets Streamlit si disponible, sinon variables
+d'environnement SFTP_*. Les valeurs absentes restent None : chaque module
+applique ses propres valeurs par défaut (core.sftp.DEFAULT_*).
+
+Réglages SSH optionnels (cf. core.sftp.PROFILS_SSH), par exemple :
+
+    [sftp]
+    profil_ssh = "texte"            # defaut | texte | latence | wan
+    compression = true              # prime sur le profil
+    window_size = 16777216
+    max_packet_size = 65536
+    ciphers = ["aes128-gcm@openssh.com", "aes128-ctr"]
+    keepalive = 30
+"""
+
+import os
+
+# clé de config -> variable d'environnement
+CLES_SFTP = {
+    "host": "SFTP_HOST",
+    "user": "SFTP_USER",
+    "pass": "SFTP_PASS",
+    "dir": "SFTP_DIR",
+    "port": "SFTP_PORT",
+    "max_sessions": "SFTP_MAX_SESSIONS",
+    "keepalive": "SFTP_KEEPALIVE",
+    "concurrency": "SFTP_CONCURRENCY",
+    "retries": "SFTP_RETRIES",
+    # Réglages SSH (cf. core.sftp.reglages_ssh) : profil nommé, et/ou clés explicites
+    "profil_ssh": "SFTP_PROFIL_SSH",
+    "compression": "SFTP_COMPRESSION",
+    "window_size": "SFTP_WINDOW_SIZE",
+    "max_packet_size": "SFTP_MAX_PACKET_SIZE",
+    "ciphers": "SFTP_CIPHERS",
+}
+DEFAULT_DIR = "refonteTest"
+
+
+def get_sftp_config(secrets=None, environ=None):
+    """
+    secrets: st.secrets (ou tout mapping avec une section "sftp") ; None ou
+    section absente -> variables d'environnement.
+    """
+    try:
+        section = secrets["sftp"]
+    except Exception:
+        section = None
+
+    if section is not None:
+        cfg = {cle: section.get(cle) for cle in CLES_SFTP}
+    else:
+        environ = os.environ if environ is None else environ
+        cfg = {cle: environ.get(var) for cle, var in CLES_SFTP.items()}
+    cfg["dir"] = cfg["dir"] or DEFAULT_DIR
+    return cfg
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Factures PDF : nommage des paires FACT_*.pdf / OU_FACT_* et mode lot
+(plusieurs PDF ou un ZIP + CSV de correspondance commande;facture).
+
+Les PDF ne sont jamais relus en bytes : chaque source est un objet fichier
+(UploadedFile, membre de ZIP) envoyé tel quel, lu en flux (cf. core.sftp.envoyer_flux).
+"""
+
+import csv
+import os
+import zipfile
+from datetime import datetime
+from io import BytesIO
+
+from core.manifeste import Manifeste
+from core.sftp import LotAtomique, cible_sftp, envoyer_blobs, get_pool, parametres_envoi, verifier_dossier
+
+
+def noms_facture(num_commande, num_facture, jour=None):
+    """
+    (nom du PDF, nom du fichier de contrôle, contenu du fichier de contrôle).
+    Contenu attendu par BOSS : "numcommande;nomfichieravecext"
+    """
+    jour = jour or datetime.now().strftime("%Y%m%d")
+    pdf_remote_name = f"FACT_{num_commande}_{jour}_{num_facture}.pdf"
+    ctrl_remote_name = f"OU_FACT_{num_commande}_{jour}_{num_facture}"
+    ctrl_content = f"{num_commande};{pdf_remote_name}"
+    return pdf_remote_name, ctrl_remote_name, ctrl_content
+
+
+def fichier_controle(ctrl_content):
+    return BytesIO(ctrl_content.encode("latin-1", errors="ignore"))
+
+
+# =============================
+# CSV de correspondance
+# =============================
+def lire_correspondance(fichier):
+    """
+    CSV "commande;facture" (3e colonne optionnelle : nom du PDF), en-tête facultatif.
+    Renvoie une liste de dicts {commande, facture, pdf}.
+    """
+    fichier.seek(0)
+    brut = fichier.read()
+    try:
+        texte = brut.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        texte = brut.decode("latin-1")
+
+    lignes = []
+    for i, champs in enumerate(csv.reader(texte.splitlines(), delimiter=";")):
+        champs = [c.strip() for c in champs]
+        if not any(champs):
+            continue
+        if i == 0 and "commande" in champs[0].lower():
+            continue  # en-tête
+        if len(champs) < 2 or not champs[0] or not champs[1]:
+            raise ValueError(f"Ligne {i + 1} invalide (attendu commande;facture) : {';'.join(champs)}")
+        lignes.append({
+            "commande": champs[0],
+            "facture": champs[1],
+            "pdf": champs[2] if len(champs) > 2 and champs[2] else None,
+        })
+    return lignes
+
+
+# =============================
+# Sources PDF (fichiers isolés ou ZIP)
+# =============================
+class SourcesPDF:
+    """
+    Index nom de fichier -> source, sans lire les PDF.
+    Les membres de ZIP ne sont ouverts (décompression en flux) qu'au moment
+    de l'envoi, et refermés par fermer().
+    """
+
+    def __init__(self, fichiers):
+        self._sources = {}
+        self._zips = []
+        self._ouverts = []
+        for f in fichiers:
+            nom = getattr(f, "name", "")
+            if nom.lower().endswith(".zip"):
+                zf = zipfile.ZipFile(f)
+                self._zips.append(zf)
+                for info in zf.infolist():
+                    if not info.is_dir() and info.filename.lower().endswith(".pdf"):
+                        self._sources.setdefault(os.path.basename(info.filename).lower(), (zf, info))
+            else:
+                self._sources.setdefault(os.path.basename(nom).lower(), (None, f))
+
+    def __len__(self):
+        return len(self._sources)
+
+    def noms(self):
+        return list(self._sources)
+
+    def trouver(self, ligne):
+        """
+        PDF d'une ligne de correspondance : colonne pdf si renseignée,
+        sinon <facture>.pdf, sinon <commande>.pdf. None si absent.
+        """
+        candidats = [ligne["pdf"]] if ligne.get("pdf") else [ligne["facture"], ligne["commande"]]
+        for c in candidats:
+            cle = os.path.basename(c).lower()
+            if not cle.endswith(".pdf"):
+                cle += ".pdf"
+            if cle in self._sources:
+                return cle
+        return None
+
+    def taille(self, cle):
+        zf, src = self._sources[cle]
+        return src.file_size if zf is not None else getattr(src, "size", None)
+
+    def ouvrir(self, cle):
+        zf, src = self._sources[cle]
+        if zf is None:
+            # Curseur indépendant par envoi ; BytesIO(bytes) partage le
+            # contenu de l'UploadedFile sans le recopier
+            return BytesIO(src.getvalue())
+        flux = zf.open(src)
+        self._ouverts.append(flux)
+        return flux
+
+    def fermer(self):
+        for flux in self._ouverts:
+            flux.close()
+        for zf in self._zips:
+            zf.close()
+        self._ouverts, self._zips = [], []
+
+
+def apparier(correspondance, sources, jour=None):
+    """
+    Construit les paires à envoyer.
+    Renvoie (paires, manquants) : paires = dicts {commande, facture, source,
+    pdf_remote_name, ctrl_remote_name, ctrl_content}, manquants = lignes sans PDF.
+    """
+    jour = jour or datetime.now().strftime("%Y%m%d")
+    paires, manquants = [], []
+    for ligne in correspondance:
+        cle = sources.trouver(ligne)
+        if cle is None:
+            manquants.append(ligne)
+            continue
+        pdf_remote_name, ctrl_remote_name, ctrl_content = noms_facture(ligne["commande"], ligne["facture"], jour)
+        paires.append({
+            "commande": ligne["commande"],
+            "facture": ligne["facture"],
+            "source": cle,
+            "pdf_remote_name": pdf_remote_name,
+            "ctrl_remote_name": ctrl_remote_name,
+            "ctrl_content": ctrl_content,
+        })
+    return paires, manquants
+
+
+# =============================
+# Envoi SFTP
+# =============================
+def envoyer_facture(num_commande, num_facture, pdf, sftp_cfg, mesures=None, jour=None):
+    """
+    Une facture : PDF renommé + fichier de contrôle, tout ou rien.
+    pdf: objet fichier (UploadedFile...), envoyé sans copie.
+    Renvoie (ok, msg, (pdf_remote_name, ctrl_remote_name, ctrl_content)).
+    """
+    noms = noms_facture(num_commande, num_facture, jour)
+    pdf_remote_name, ctrl_remote_name, ctrl_content = noms
+    ok, msg = envoyer_blobs(
+        [(pdf_remote_name, pdf), (ctrl_remote_name, fichier_controle(ctrl_content))],
+        sftp_cfg,
+        mesures
+    )
+    return ok, msg, noms
+
+
+def envoyer_lot_factures(paires, sources, sftp_cfg, mesures=None, progression=None):
+    """
+    Mode lot : toutes les paires sur les sessions du pool (une seule connexion
+    par défaut, `concurrency` en parallèle si configuré).
+    Tout est écrit sous noms temporaires, puis renommé en fin de lot : les PDF
+    d'abord, puis les fichiers de contrôle des seuls PDF validés. BOSS ne voit
+    jamais un OU_FACT_* sans son PDF, ni un PDF à moitié écrit.
+    Un lot interrompu reprend sans renvoyer ce qui est déjà transféré.
+    progression: callback(ok, nom) appelé après chaque transfert
+    Renvoie (ok, msg, paires envoyées).
+    """
+    par_nom = {p["pdf_remote_name"]: p for p in paires}
+    echecs = []
+
+    def transferer(named_blobs):
+        ok_noms = []
+        for nom, _, erreur in lot.transferer(named_blobs, concurrency=concurrency, retries=retries):
+            if erreur is None:
+                ok_noms.append(nom)
+            else:
+                echecs.append(f"{nom} ({erreur})")
+            if progression is not None:
+                progression(erreur is None, nom)
+        return ok_noms
+
+    def valider(noms):
+        ok_noms = []
+        for nom, _, erreur in lot.valider(noms):
+            if erreur is None:
+                ok_noms.append(nom)
+            else:
+                echecs.append(f"{nom} (renommage : {erreur})")
+        return ok_noms
+
+    try:
+        # Config invalide (profil SSH inconnu, entier illisible...) : message, pas de trace
+        parametres = parametres_envoi(sftp_cfg)
+        if parametres is None:
+            return False, "Identifiants SFTP manquants", []
+        dir_remote, concurrency, retries = parametres
+        pool = get_pool(sftp_cfg)
+        lot = LotAtomique(pool, dir_remote, Manifeste(cible_sftp(sftp_cfg)), mesures)
+        verifier_dossier(pool, dir_remote, mesures)
+
+        # 1) PDF, lus en flux depuis les fichiers chargés / le ZIP
+        pdf_ok = transferer(
+            (p["pdf_remote_name"], sources.ouvrir(p["source"])) for p in paires
+        )
+        # 2) Fichiers de contrôle
+        ctrl_noms = {par_nom[n]["ctrl_remote_name"]: par_nom[n] for n in pdf_ok}
+        ctrl_ok = transferer(
+            (nom, fichier_controle(p["ctrl_content"])) for nom, p in ctrl_noms.items()
+        )
+        # 3) Validation : PDF, puis contrôles dont le PDF est en place
+        pdf_valides = set(valider(pdf_ok))
+        ctrl_valides = valider(
+            [n for n in ctrl_ok if ctrl_noms[n]["pdf_remote_name"] in pdf_valides]
+        )
+        lot.terminer()
+    except Exception as e:
+        return False, str(e), []
+    finally:
+        sources.fermer()
+
+    envoyees = [ctrl_noms[n] for n in ctrl_valides]
+    reprise = f" ({lot.reprises} fichier(s) repris d'un envoi interrompu)" if lot.reprises else ""
+    if echecs:
+        apercu = ", ".join(echecs[:10]) + (" …" if len(echecs) > 10 else "")
+        return False, (
+            f"{len(envoyees)}/{len(paires)} facture(s) envoyée(s) sur {dir_remote}{reprise}, "
+            f"{len(echecs)} échec(s) : {apercu} — relancer le lot pour reprendre"
+        ), envoyees
+    return True, f"{len(envoyees)} facture(s) envoyée(s) sur {dir_remote} ({2 * len(envoyees)} fichiers){reprise}", envoyees
@@ -0,0 +1,571 @@
+# -*- coding: utf-8 -*-
+"""
+Génération des fichiers OU_EXP (états de commande) à partir de l'export BOSS.
+"""
+
+import csv
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from io import BytesIO
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+LIGNES_PAR_BLOC = 2000         # lignes source planifiées puis sérialisées d'un coup (= 1 tâche en multi-processus)
+TAILLE_PROCESS_POOL = os.cpu_count() or 1
+
+# Colonnes source lues par la génération (champs pipe)
+CHAMPS_PIPE = ["Reference", "Quantité", "prixUnitHt", "prixAchatHt", "Code Mistral", "Libellé"]
+
+# Colonnes du fichier OU_EXP (ordre de sortie)
+COLONNES_OU_EXP = [
+    "No Transaction", "No Ligne", "No Commande Client", "Etat", "No Tracking",
+    "No Transporteur", "Code article", "Désignation", "Quantité", "PV net", "PA net",
+]
+
+# Caractères interdits dans la référence utilisée pour le nom de fichier
+_NOM_INVALIDE = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+# =============================
+# Tables calculées une fois par lot
+# =============================
+class PlanLot:
+    """
+    Tout ce qui ne dépend pas des lignes source, calculé une fois par lot :
+    tableaux des états et des transporteurs (id / tracking) indexés par
+    tirage et par rang de commande, générateur aléatoire.
+    `graine` rend le mode "aleatoire" reproductible (None = tirage libre).
+    """
+
+    def __init__(self, etats, transporteurs, mode_etat, graine=None):
+        self.etats = np.array(etats or [], dtype=object)
+        self.mode_etat = mode_etat
+        self.t_ids = np.array([t["id"] for t in transporteurs], dtype=object)
+        self.t_trk = np.array([t["tracking"] for t in transporteurs], dtype=object)
+        self.rng = np.random.default_rng(graine) if mode_etat == "aleatoire" else None
+
+    def tirer_etats(self, depart, nb):
+        """
+        États des tirages n° depart .. depart + nb - 1 (ordre du fichier).
+        """
+        if self.mode_etat == "unique":
+            return np.full(nb, self.etats[0], dtype=object)
+        if self.mode_etat == "cyclique":
+            return self.etats[(depart + np.arange(nb)) % len(self.etats)]
+        return self.etats[self.rng.integers(0, len(self.etats), nb)]
+
+    def transporteurs(self, rangs):
+        """
+        (id transporteur, tracking) du tourniquet pour chaque rang de commande.
+        """
+        t_idx = rangs % len(self.t_ids)
+        return self.t_ids[t_idx], self.t_trk[t_idx]
+
+
+# Conversions valeur par valeur, appliquées uniquement aux valeurs distinctes
+def _to_float_safe(val):
+    s = str(val).strip().replace("\xa0", "").replace(" ", "").replace(",", ".")
+    try:
+        return float(s)
+    except Exception:
+        return 0.0
+
+
+def _format_price(val):
+    if val == "":
+        return ""
+    try:
+        return str(round(_to_float_safe(val) / 100, 2)).replace(".", ",")
+    except Exception:
+        return ""
+
+
+def _to_int_safe(val):
+    if val == "":
+        return 0
+    try:
+        return int(float(str(val).replace(",", ".").strip()))
+    except Exception:
+        return 0
+
+
+def _map_unique(values, func):
+    # Parse une colonne entière : une seule conversion par valeur distincte
+    codes, uniques = pd.factorize(values)
+    parsed = np.array([func(u) for u in uniques], dtype=object)
+    return parsed[codes]
+
+
+# =============================
+# Fonction génération fichiers commande
+# =============================
+def _sans_code_vide(df):
+    # Filtre "Code Mistral" vide
+    if "Code Mistral" in df.columns:
+        df = df[df["Code Mistral"].notna()]
+        df = df[df["Code Mistral"].astype(str).str.strip() != ""]
+    return df
+
+
+def _eclater(df, col):
+    """
+    Champ pipe éclaté en une passe : (valeurs à plat, nb de valeurs par ligne).
+    Colonne absente -> [""] ; cellule vide (NaN) -> []
+    """
+    nb_rows = len(df)
+    if col not in df.columns:
+        return np.full(nb_rows, "", dtype=object), np.ones(nb_rows, dtype=np.int64)
+    s = df[col]
+    na = s.isna().to_numpy()
+    parts = [[] if is_na else str(v).split("|") for v, is_na in zip(s.tolist(), na)]
+    lens = np.fromiter((len(p) for p in parts), dtype=np.int64, count=nb_rows)
+    flat = pd.Series(list(chain.from_iterable(parts)), dtype=object)
+    return flat.str.strip().to_numpy(dtype=object), lens
+
+
+def _compter_bloc(df, nb_max, partiel_active, partiel_qte, partiel_etat_a, partiel_etat_b):
+    """
+    (commandes, tirages d'état) que _planifier_bloc produira sur ce bloc, sans
+    le planifier : seuls les codes et les quantités sont éclatés. Donne le
+    rang_depart / tirage_depart du bloc suivant.
+    """
+    df = _sans_code_vide(df)
+    nb_rows = len(df)
+    if nb_rows == 0 or "Code Mistral" not in df.columns:
+        return 0, 0
+    codes, lens = _eclater(df, "Code Mistral")
+    row_of = np.repeat(np.arange(nb_rows), lens)
+    pos = np.arange(len(codes)) - (np.cumsum(lens) - lens)[row_of]
+    q_flat, q_lens = _eclater(df, "Quantité")
+    valid = pos < q_lens[row_of]
+    qtes = np.full(len(codes), "", dtype=object)
+    qtes[valid] = q_flat[(np.cumsum(q_lens) - q_lens)[row_of[valid]] + pos[valid]]
+
+    keep = codes != ""
+    row_of, qtes = row_of[keep], qtes[keep]
+    emise = np.bincount(row_of, minlength=nb_rows) > 0
+    if nb_max:
+        emise &= np.cumsum(emise) <= nb_max
+
+    # 1 tirage par ligne ; ligne coupée : 1 par partie sans état imposé
+    qte = _map_unique(qtes, _to_int_safe).astype(np.int64)
+    qte[qte <= 0] = 1
+    tirages = np.ones(len(qte), dtype=np.int64)
+    if partiel_active:
+        tirages[qte > partiel_qte] = (not partiel_etat_a) + (not partiel_etat_b)
+    return int(emise.sum()), int(tirages[emise[row_of]].sum())
+
+
+def _planifier_bloc(
+    df,
+    plan_lot,                   # PlanLot
+    nb_max,
+    partiel_active,
+    partiel_qte,
+    partiel_etat_a,
+    partiel_etat_b,
+    rang_depart=0,              # commandes déjà générées (blocs précédents)
+    tirage_depart=0,            # états déjà tirés (mode cyclique)
+    mesures=None,               # core.metrics.Mesures (optionnel)
+    etats_tires=None            # états déjà tirés pour ce bloc (multi-processus)
+):
+    """
+    Passe en colonnes sur un bloc du fichier source : toutes les lignes à
+    exporter, en tuples de chaînes.
+    Renvoie None si rien à exporter, sinon (rows, bornes, refs, labels, nb_tirages) :
+    bornes = 1re ligne de chaque commande, refs = référence pour le nom de fichier,
+    labels = index de la ligne source de chaque commande.
+    """
+    t_debut = time.perf_counter()
+    no_commande_base = 1873036
+
+    df = _sans_code_vide(df)
+    nb_rows = len(df)
+    if nb_rows == 0:
+        return None
+
+    # --- Éclatement des champs pipe en une passe ---
+    split = {c: _eclater(df, c) for c in CHAMPS_PIPE}
+
+    n_par_ligne = np.max(np.vstack([lens for _, lens in split.values()]), axis=0)
+    total = int(n_par_ligne.sum())
+    if total == 0:
+        return None
+
+    row_of = np.repeat(np.arange(nb_rows), n_par_ligne)
+    starts = np.cumsum(n_par_ligne) - n_par_ligne
+    pos = np.arange(total) - starts[row_of]
+
+    def at_column(col):
+        flat, lens = split[col]
+        offsets = np.cumsum(lens) - lens
+        valid = pos < lens[row_of]
+        out = np.full(total, "", dtype=object)
+        out[valid] = flat[offsets[row_of[valid]] + pos[valid]]
+        return out
+
+    codes = at_column("Code Mistral")
+    keep = codes != ""
+
+    # Commandes émises (au moins une ligne avec code) + limite nb_max
+    lignes_par_row = np.bincount(row_of[keep], minlength=nb_rows)
+    emise = lignes_par_row > 0
+    rang = np.cumsum(emise) - 1 + rang_depart
+    if nb_max:
+        emise &= rang < rang_depart + nb_max
+    keep &= emise[row_of]
+    if not keep.any():
+        return None
+
+    row_l = row_of[keep]
+    code_l = codes[keep]
+    details_l = at_column("Reference")[keep]
+    qtes_l = at_column("Quantité")[keep]
+    pv_l = at_column("prixUnitHt")[keep]
+    pa_l = at_column("prixAchatHt")[keep]
+    libs_l = at_column("Libellé")[keep]
+
+    # Référence transaction : détail i, sinon 1er détail, sinon index source
+    ref_flat, ref_lens = split["Reference"]
+    ref_offsets = np.cumsum(ref_lens) - ref_lens
+    idx_str = np.array([str(i) for i in df.index], dtype=object)
+    ref_row = idx_str.copy()
+    has_ref = ref_lens > 0
+    ref_row[has_ref] = ref_flat[ref_offsets[has_ref]]
+    no_transaction = np.where(details_l != "", details_l, ref_row[row_l])
+
+    # Quantités / prix (colonnes entières)
+    qte_full = _map_unique(qtes_l, _to_int_safe).astype(np.int64)
+    qte_full[qte_full <= 0] = 1  # fallback
+    pv_val = _map_unique(pv_l, _format_price)
+    pa_val = _map_unique(pa_l, _format_price)
+
+    # === LOGIQUE PARTIELLE === : une ligne -> (partielle A, reliquat B)
+    if partiel_active:
+        coupe = qte_full > partiel_qte
+    else:
+        coupe = np.zeros(len(qte_full), dtype=bool)
+    rep = np.where(coupe, 2, 1)
+    src = np.repeat(np.arange(len(qte_full)), rep)
+    part = np.arange(len(src)) - np.repeat(np.cumsum(rep) - rep, rep)  # 0 = A, 1 = B
+    coupe_x = coupe[src]
+    est_a = coupe_x & (part == 0)
+    est_b = coupe_x & (part == 1)
+
+    qte_x = qte_full[src].astype(object)
+    qte_x[est_a] = partiel_qte
+    qte_x[est_b] = qte_full[src][est_b] - partiel_qte
+
+    # Sélection de l'état selon le mode choisi (même ordre de tirage que ligne à ligne)
+    etat_x = np.full(len(src), "", dtype=object)
+    tirage = ~coupe_x.copy()
+    if partiel_etat_a:
+        etat_x[est_a] = partiel_etat_a
+    else:
+        tirage |= est_a
+    if partiel_etat_b:
+        etat_x[est_b] = partiel_etat_b
+    else:
+        tirage |= est_b
+    nb_tirages = int(tirage.sum())
+    if etats_tires is not None:
+        etat_x[tirage] = etats_tires
+    elif len(plan_lot.etats) and nb_tirages:
+        etat_x[tirage] = plan_lot.tirer_etats(tirage_depart, nb_tirages)
+
+    # Commande / transporteur (tourniquet) / n° de ligne
+    row_x = row_l[src]
+    rang_x = rang[row_x]
+    t_id_x, t_trk_x = plan_lot.transporteurs(rang_x)
+    tracking = np.where(etat_x == "En cours de livraison", t_trk_x, "")
+
+    debut = np.r_[True, row_x[1:] != row_x[:-1]]
+    bornes = np.flatnonzero(debut)
+    no_ligne = np.arange(len(row_x)) - np.repeat(bornes, np.diff(np.r_[bornes, len(row_x)])) + 1
+
+    # Lignes prêtes à écrire : tuples de 11 chaînes dans l'ordre COLONNES_OU_EXP
+    rows = list(zip(
+        no_transaction[src],
+        no_ligne.astype(str),
+        (no_commande_base + rang_x).astype(str),
+        etat_x,
+        tracking,
+        t_id_x,
+        code_l[src],
+        libs_l[src],
+        [str(q) for q in qte_x],
+        pv_val[src],
+        pa_val[src],
+    ))
+
+    if mesures is not None:
+        mesures.ajouter("generation", time.perf_counter() - t_debut)
+
+    labels = df.index.to_numpy()[row_x[bornes]]
+    return rows, bornes, ref_row[row_x[bornes]], labels, nb_tirages
+
+
+# =============================
+# Sérialisation (un fichier par commande)
+# =============================
+class _Collecteur(list):
+    # Cible de csv.writer : une chaîne par ligne écrite
+    write = list.append
+
+
+def _csv_writer(cible):
+    # Mêmes réglages que DataFrame.to_csv(sep=";") : sortie identique, guillemets compris
+    return csv.writer(cible, delimiter=";", quotechar='"', doublequote=True,
+                      quoting=csv.QUOTE_MINIMAL, lineterminator=os.linesep)
+
+
+def _entete_ou_exp():
+    lignes = _Collecteur()
+    _csv_writer(lignes).writerow(COLONNES_OU_EXP)
+    return lignes[0].encode("latin-1")
+
+
+ENTETE_OU_EXP = _entete_ou_exp()
+
+
+def _serialiser(rows, bornes, refs, mesures=None):
+    """
+    Écriture directe du format OU_EXP (sans DataFrame par commande) : toutes
+    les lignes du bloc sont écrites puis encodées en latin-1 en une fois, et
+    chaque fichier est l'en-tête + une tranche (memoryview) de ce buffer.
+    """
+    t0 = time.perf_counter()
+    lignes = _Collecteur()
+    _csv_writer(lignes).writerows(rows)
+    try:
+        corps = memoryview("".join(lignes).encode("latin-1"))
+        # latin-1 : 1 caractère = 1 octet, les offsets en caractères sont des offsets en octets
+        offsets = np.r_[0, np.cumsum([len(ligne) for ligne in lignes])]
+    except UnicodeEncodeError:
+        corps = None  # encodage commande par commande : l'erreur sort sur la commande fautive
+    if mesures is not None:
+        mesures.ajouter("to_csv", time.perf_counter() - t0)
+
+    fins = np.r_[bornes[1:], len(rows)]
+    for debut_cmd, fin_cmd, ref_for_name in zip(bornes, fins, refs):
+        # Nom de fichier
+        horodatage = datetime.now().strftime("%Y%m%d%H%M%S")
+        ref_for_name = _NOM_INVALIDE.sub('_', ref_for_name)
+        fichier_nom = f"OU_EXP_{ref_for_name}_{horodatage}.csv"
+
+        # Buffer
+        t0 = time.perf_counter()
+        if corps is not None:
+            data = b"".join((ENTETE_OU_EXP, corps[offsets[debut_cmd]:offsets[fin_cmd]]))
+        else:
+            data = ENTETE_OU_EXP + "".join(lignes[debut_cmd:fin_cmd]).encode("latin-1")
+        buffer = BytesIO(data)
+        if mesures is not None:
+            mesures.ajouter("to_csv", time.perf_counter() - t0, len(data), 1)
+
+        yield fichier_nom, buffer
+
+
+def _generer_shard(bloc, plan_lot, nb_max, partiel, rang_depart, tirage_depart, etats_tires):
+    # Exécuté dans un processus worker : planification et sérialisation du bloc
+    t0 = time.perf_counter()
+    plan = _planifier_bloc(bloc, plan_lot, nb_max, *partiel, rang_depart=rang_depart,
+                           tirage_depart=tirage_depart, etats_tires=etats_tires)
+    t1 = time.perf_counter()
+    if plan is None:
+        return [], [], t1 - t0, 0.0
+    rows, bornes, refs, labels, _ = plan
+    fichiers = [(nom, buffer.getvalue()) for nom, buffer in _serialiser(rows, bornes, refs)]
+    return fichiers, labels, t1 - t0, time.perf_counter() - t1
+
+
+_PROCESS_POOL = None
+_PROCESS_POOL_LOCK = threading.Lock()
+
+
+def get_process_pool():
+    """
+    Pool de processus unique au processus principal, de TAILLE_PROCESS_POOL
+    workers, partagé par tous les lots : chacun borne ses propres tâches en vol.
+    Démarrage "spawn" : pas de fork d'un serveur Streamlit multi-thread.
+    """
+    global _PROCESS_POOL
+    with _PROCESS_POOL_LOCK:
+        if _PROCESS_POOL is None:
+            _PROCESS_POOL = ProcessPoolExecutor(
+                max_workers=TAILLE_PROCESS_POOL, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _PROCESS_POOL
+
+
+def _reset_process_pool(executor):
+    # Worker mort : le pool cassé est remplacé au prochain lot (les autres lots
+    # en cours échouent déjà avec lui, leurs tâches ne sont pas annulées ici)
+    global _PROCESS_POOL
+    with _PROCESS_POOL_LOCK:
+        if _PROCESS_POOL is executor:
+            _PROCESS_POOL = None
+    executor.shutdown(wait=False)
+
+
+def _generer_sequentiel(blocs, plan_lot, nb_max, partiel, mesures=None):
+    """
+    (nom, BytesIO, index source) bloc après bloc, dans ce processus.
+    """
+    nb_commandes = 0
+    nb_tirages = 0
+    for bloc in blocs:
+        reste = None
+        if nb_max:
+            reste = nb_max - nb_commandes
+            if reste <= 0:
+                return
+        plan = _planifier_bloc(
+            bloc, plan_lot, reste, *partiel,
+            rang_depart=nb_commandes, tirage_depart=nb_tirages, mesures=mesures
+        )
+        if plan is None:
+            continue
+        rows, bornes, refs, labels, n_tir = plan
+        for (nom, buffer), label in zip(_serialiser(rows, bornes, refs, mesures), labels):
+            yield nom, buffer, label
+        nb_commandes += len(bornes)
+        nb_tirages += n_tir
+
+
+def _generer_parallele(blocs, plan_lot, nb_max, partiel, processus, mesures=None):
+    """
+    (nom, BytesIO, index source) : chaque bloc est planifié et sérialisé par
+    un worker du pool partagé. Ici, seuls les commandes et tirages de chaque
+    bloc sont comptés (rang_depart / tirage_depart du suivant) et les états
+    tirés, dans l'ordre : sortie identique au séquentiel.
+    Au plus `processus` blocs de ce lot en vol ; fichiers produits dans
+    l'ordre des blocs.
+    """
+    executor = get_process_pool()
+    en_vol = deque()
+
+    def taches():
+        nb_commandes = 0
+        nb_tirages = 0
+        for bloc in blocs:
+            reste = None
+            if nb_max:
+                reste = nb_max - nb_commandes
+                if reste <= 0:
+                    return
+            t0 = time.perf_counter()
+            n_cmd, n_tir = _compter_bloc(bloc, reste, *partiel)
+            if n_cmd == 0:
+                continue
+            etats_tires = plan_lot.tirer_etats(nb_tirages, n_tir) if len(plan_lot.etats) and n_tir else None
+            if mesures is not None:
+                mesures.ajouter("generation", time.perf_counter() - t0)
+            bloc = bloc[[c for c in CHAMPS_PIPE if c in bloc.columns]]  # seules colonnes utiles envoyées
+            yield executor.submit(_generer_shard, bloc, plan_lot, reste, partiel,
+                                  nb_commandes, nb_tirages, etats_tires)
+            nb_commandes += n_cmd
+            nb_tirages += n_tir
+
+    futures = taches()
+    try:
+        for fut in futures:
+            en_vol.append(fut)
+            if len(en_vol) >= processus:
+                break
+        while en_vol:
+            try:
+                fichiers, labels, t_plan, t_csv = en_vol.popleft().result()
+            except BrokenProcessPool:
+                _reset_process_pool(executor)
+                raise
+            fut = next(futures, None)
+            if fut is not None:
+                en_vol.append(fut)
+            if mesures is not None:
+                mesures.ajouter("generation", t_plan)
+                mesures.ajouter("to_csv", t_csv, sum(len(data) for _, data in fichiers), len(fichiers))
+            for (nom, data), label in zip(fichiers, labels):
+                yield nom, BytesIO(data), label
+    finally:
+        # Lot abandonné en cours de route : ses tâches pas encore lancées sont retirées
+        for fut in en_vol:
+            fut.cancel()
+
+
+def _tranches(blocs, taille):
+    # Vues de `taille` lignes (iloc : pas de copie des données)
+    for bloc in blocs:
+        for debut in range(0, len(bloc), taille):
+            yield bloc.iloc[debut:debut + taille]
+
+
+def iter_csv_par_commande(
+    df,
+    etats: list,
+    transporteurs: list,
+    mode_etat: str,             # "unique" | "cyclique" | "aleatoire"
+    nb_max=None,
+    partiel_active=False,       # True/False
+    partiel_qte=1,              # quantité pour la ligne partielle
+    partiel_etat_a=None,        # état pour la partie partielle
+    partiel_etat_b=None,        # état pour le reliquat
+    mesures=None,               # core.metrics.Mesures (optionnel)
+    processus=1,                # > 1 : sérialisation répartie sur N processus
+    avec_index=False,           # True : (nom, BytesIO, index de la ligne source)
+    graine=None                 # mode "aleatoire" reproductible
+):
+    """
+    Génération en colonnes : les champs pipe sont éclatés en une passe, puis
+    prix / quantités / états / transporteurs / n° de ligne sont calculés sur
+    des tableaux entiers. Sortie identique octet pour octet à l'ancienne
+    boucle df.iterrows().
+
+    Générateur : chaque (nom, BytesIO) est produit dès qu'il est sérialisé,
+    l'envoi peut donc commencer sans attendre la fin du lot.
+
+    `df` peut aussi être un itérable de DataFrames (lecture par blocs) :
+    n° de commande, tourniquet transporteur, cycle des états et nb_max
+    continuent d'un bloc à l'autre. Chaque DataFrame est lui-même traité par
+    tranches de LIGNES_PAR_BLOC lignes : le 1er fichier sort sans attendre la
+    planification du lot entier, et la mémoire ne dépend pas de sa taille.
+
+    Avec `processus` > 1, chaque bloc est planifié et sérialisé dans un
+    worker (jusqu'à `processus` blocs en parallèle) ; seuls le comptage des
+    commandes / tirages et le tirage des états restent ici (ordre identique).
+
+    Avec `avec_index`, chaque fichier est accompagné de l'index (dans le
+    DataFrame source) de la 1re ligne de sa commande : permet de relier un
+    fichier envoyé à la commande d'origine (cf. core.historique).
+
+    Avec `graine`, le mode "aleatoire" tire toujours la même suite d'états :
+    deux lancements sur la même source produisent les mêmes fichiers.
+    """
+    blocs = _tranches([df] if isinstance(df, pd.DataFrame) else df, LIGNES_PAR_BLOC)
+    plan_lot = PlanLot(etats, transporteurs, mode_etat, graine)
+    partiel = (partiel_active, partiel_qte, partiel_etat_a, partiel_etat_b)
+    if processus and processus > 1:
+        fichiers = _generer_parallele(blocs, plan_lot, nb_max, partiel, processus, mesures)
+    else:
+        fichiers = _generer_sequentiel(blocs, plan_lot, nb_max, partiel, mesures)
+    for nom, buffer, label in fichiers:
+        if avec_index:
+            yield nom, buffer, label
+        else:
+            yield nom, buffer
+
+
+def generer_csv_par_commande(*args, **kwargs):
+    """
+    Version liste de iter_csv_par_commande (tous les fichiers en mémoire).
+    """
+    return list(iter_csv_par_commande(*args, **kwargs))
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Index local (SQLite) des commandes déjà envoyées, pour les envois
+incrémentaux : seules les commandes nouvelles ou modifiées depuis le dernier
+envoi vers la même cible SFTP sont régénérées.
+
+Clé : (cible, Reference) -> empreinte des champs source de la commande
+(Reference, Quantité, prix, Code Mistral, Libellé). Une commande dont
+l'empreinte change est considérée comme modifiée.
+"""
+
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+import pandas as pd
+
+from core.source import COLONNES_SOURCE
+
+DEFAULT_DB = "historique_envois.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS envois (
+    cible      TEXT NOT NULL,
+    reference  TEXT NOT NULL,
+    empreinte  TEXT NOT NULL,
+    fichier    TEXT,
+    envoye_le  TEXT NOT NULL,
+    PRIMARY KEY (cible, reference)
+)
+"""
+
+
+def empreintes(df):
+    """
+    (reference, empreinte) par ligne du DataFrame source, calculés en colonnes.
+    """
+    cols = [c for c in COLONNES_SOURCE if c in df.columns]
+    texte = [df[c].astype(object).where(df[c].notna(), "").astype(str) for c in cols]
+    combine = texte[0]
+    for col in texte[1:]:
+        combine = combine + "\x1f" + col
+    hashes = pd.util.hash_pandas_object(combine, index=False).to_numpy()
+    reference = texte[cols.index("Reference")] if "Reference" in cols else pd.Series("", index=df.index)
+    return pd.DataFrame({
+        "reference": reference.to_numpy(),
+        "empreinte": [f"{h:016x}" for h in hashes],
+    }, index=df.index)
+
+
+class HistoriqueEnvois:
+    def __init__(self, chemin=None, cible=""):
+        self.chemin = chemin or os.environ.get("HISTORIQUE_DB", DEFAULT_DB)
+        self.cible = cible
+        with closing(self._connect()) as conn, conn:
+            conn.execute(_SCHEMA)
+
+    def _connect(self):
+        # Une connexion par opération : utilisable depuis les threads d'envoi
+        conn = sqlite3.connect(self.chemin, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def statuts(self, df):
+        """
+        Empreintes du DataFrame + statut de chaque commande :
+        "nouvelle", "modifiee" ou "envoyee" (déjà envoyée à l'identique).
+        """
+        cles = empreintes(df)
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TEMP TABLE lot (reference TEXT PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO lot VALUES (?)", ((r,) for r in cles["reference"]))
+            connues = dict(conn.execute(
+                "SELECT e.reference, e.empreinte FROM envois e JOIN lot USING (reference) WHERE e.cible = ?",
+                (self.cible,)
+            ).fetchall())
+        precedente = cles["reference"].map(connues)
+        cles["statut"] = "nouvelle"
+        cles.loc[precedente.notna(), "statut"] = "modifiee"
+        cles.loc[precedente == cles["empreinte"], "statut"] = "envoyee"
+        return cles
+
+    def compter(self, df):
+        """
+        Pré-contrôle rapide : nombre de commandes nouvelles / modifiées / déjà envoyées.
+        """
+        compte = self.statuts(df)["statut"].value_counts()
+        return {s: int(compte.get(s, 0)) for s in ("nouvelle", "modifiee", "envoyee")}
+
+    def filtrer(self, df):
+        """
+        Garde les commandes nouvelles ou modifiées.
+        Renvoie (df_filtré, cles) où cles[label] = (reference, empreinte).
+        `df` peut être un itérable de blocs : le filtre est alors appliqué bloc par bloc.
+        """
+        cles = {}
+
+        def filtrer_bloc(bloc):
+            statuts = self.statuts(bloc)
+            garder = (statuts["statut"] != "envoyee").to_numpy()
+            cles.update(zip(
+                statuts.index[garder],
+                zip(statuts["reference"][garder], statuts["empreinte"][garder])
+            ))
+            return bloc[garder]
+
+        if isinstance(df, pd.DataFrame):
+            return filtrer_bloc(df), cles
+        return (filtrer_bloc(bloc) for bloc in df), cles
+
+    def enregistrer(self, envois):
+        """
+        envois: itérable de (reference, empreinte, fichier) effectivement envoyés.
+        """
+        maintenant = datetime.now().isoformat(timespec="seconds")
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO envois (cible, reference, empreinte, fichier, envoye_le) "
+                "VALUES (?, ?, ?, ?, ?)",
+                ((self.cible, ref, emp, fichier, maintenant) for ref, emp, fichier in envois)
+            )
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Exécution des envois en tâche de fond.
+
+Le clic sur "Générer et envoyer" soumet le lot comme une tâche (job) à un
+pool de threads unique au processus et rend la main tout de suite : la page
+affiche ensuite l'avancement (fichiers envoyés, débit) en interrogeant le
+job. Un rerun ou une reconnexion du navigateur n'interrompt pas l'envoi.
+"""
+
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+DEFAULT_MAX_WORKERS = 2     # lots traités en même temps
+DEFAULT_MAX_JOBS = 50       # jobs terminés gardés en mémoire (les plus anciens sont oubliés)
+
+EN_ATTENTE = "en_attente"
+EN_COURS = "en_cours"
+TERMINE = "termine"
+ERREUR = "erreur"
+
+
+class Job:
+    def __init__(self, description=""):
+        self.id = uuid.uuid4().hex[:12]
+        self.description = description
+        self.etat = EN_ATTENTE
+        self.cree = datetime.now()
+        self.debut = None
+        self.fin = None
+        self.fichiers_ok = 0
+        self.fichiers_erreur = 0
+        self.resultat = None
+        self.erreur = None
+        self.trace = None
+        self._lock = threading.Lock()
+
+    def avancer(self, ok=True, nom=None):
+        """
+        Callback d'avancement : un fichier traité (envoyé ou en échec).
+        Signature des callbacks `progression(ok, nom)` des fonctions d'envoi.
+        """
+        with self._lock:
+            if ok:
+                self.fichiers_ok += 1
+            else:
+                self.fichiers_erreur += 1
+
+    @property
+    def termine(self):
+        return self.etat in (TERMINE, ERREUR)
+
+    def instantane(self):
+        with self._lock:
+            debut = self.debut
+            duree = ((self.fin or time.time()) - debut) if debut else 0.0
+            return {
+                "id": self.id,
+                "description": self.description,
+                "etat": self.etat,
+                "fichiers_ok": self.fichiers_ok,
+                "fichiers_erreur": self.fichiers_erreur,
+                "secondes": round(duree, 1),
+                "fichiers_par_s": round(self.fichiers_ok / duree, 1) if duree else None,
+            }
+
+
+class JobRunner:
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_jobs=DEFAULT_MAX_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="envoi")
+        self._jobs = OrderedDict()
+        self._max_jobs = max_jobs
+        self._lock = threading.Lock()
+
+    def soumettre(self, fn, description=""):
+        """
+        Lance fn(job) en tâche de fond ; sa valeur de retour devient job.resultat.
+        Renvoie le job immédiatement.
+        """
+        job = Job(description)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._purger()
+        self._executor.submit(self._executer, job, fn)
+        return job
+
+    @staticmethod
+    def _executer(job, fn):
+        job.debut = time.time()
+        job.etat = EN_COURS
+        try:
+            job.resultat = fn(job)
+            job.etat = TERMINE
+        except Exception as e:
+            job.erreur = str(e)
+            job.trace = traceback.format_exc()
+            job.etat = ERREUR
+        finally:
+            job.fin = time.time()
+
+    def _purger(self):
+        # Oublie les plus vieux jobs terminés au-delà de max_jobs
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self._max_jobs:
+                break
+            if self._jobs[job_id].termine:
+                del self._jobs[job_id]
+
+    def job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def retirer(self, job_id):
+        with self._lock:
+            return self._jobs.pop(job_id, None)
+
+
+_RUNNER = None
+_RUNNER_LOCK = threading.Lock()
+
+
+def get_runner():
+    """
+    JobRunner unique au processus (partagé par toutes les sessions).
+    """
+    global _RUNNER
+    with _RUNNER_LOCK:
+        if _RUNNER is None:
+            _RUNNER = JobRunner()
+    return _RUNNER
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Magasin local des lots générés, pour les téléchargements.
+
+Chaque lot est un dossier (identifiant court) contenant ses fichiers OU_EXP
+et son archive éventuelle, écrits au fil de la génération : rien ne reste en
+mémoire dans la session Streamlit, qui ne garde que l'identifiant du lot.
+Les fichiers ne sont relus qu'au moment du téléchargement.
+
+Les lots expirent après `ttl` secondes sans accès ; au-delà du quota disque,
+les moins récemment utilisés sont supprimés en premier.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+
+DEFAULT_DOSSIER = "lots_generes"
+DEFAULT_TTL = 24 * 3600                 # secondes sans accès avant suppression
+DEFAULT_QUOTA = 2 * 1024 ** 3           # octets occupés par tous les lots
+META = "_lot.json"                      # liste ordonnée des fichiers, nom de l'archive
+ZIP_LOT = "_lot.zip"                    # archive de tout le lot, créée au 1er téléchargement
+
+
+class LotDisque:
+    """
+    Lot en cours d'écriture (cf. MagasinLots.nouveau_lot).
+    """
+
+    def __init__(self, magasin, lot_id):
+        self.magasin = magasin
+        self.id = lot_id
+        self.dossier = magasin.chemin(lot_id)
+        self.noms = []
+        self.archive = None
+        self.ferme = False
+        os.makedirs(self.dossier, exist_ok=True)
+
+    def ajouter(self, nom, buffer):
+        # Renvoie la taille écrite
+        with open(os.path.join(self.dossier, nom), "wb") as f:
+            octets = f.write(buffer.getvalue())
+        self.noms.append(nom)
+        return octets
+
+    def tee(self, named_blobs, mesures=None):
+        """
+        Écrit chaque (nom, BytesIO) dans le lot au passage, sans interrompre le flux.
+        """
+        for nom, buffer in named_blobs:
+            t0 = time.perf_counter()
+            octets = self.ajouter(nom, buffer)
+            if mesures is not None:
+                mesures.ajouter("store_lot", time.perf_counter() - t0, octets, 1)
+            yield nom, buffer
+
+    def fermer(self, archive=None):
+        """
+        Enregistre la liste des fichiers (ordre de génération, doublons : le
+        dernier l'emporte) ; `archive` : nom de l'archive écrite dans le dossier.
+        Sans effet sur un lot déjà fermé.
+        """
+        if self.ferme:
+            return self.id
+        self.ferme = True
+        self.archive = archive
+        meta = {"fichiers": list(dict.fromkeys(self.noms)), "archive": archive, "cree": time.time()}
+        temp = os.path.join(self.dossier, META + ".part")
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(temp, os.path.join(self.dossier, META))
+        self.magasin.liberer(self.id)
+        return self.id
+
+
+class MagasinLots:
+    def __init__(self, dossier=None, ttl=DEFAULT_TTL, quota=DEFAULT_QUOTA):
+        self.dossier = dossier or os.environ.get("LOTS_DIR", DEFAULT_DOSSIER)
+        self.ttl = ttl
+        self.quota = quota
+        self._en_ecriture = set()       # lots jamais supprimés par purger()
+        self._lock = threading.Lock()
+
+    def chemin(self, lot_id, nom=None):
+        # Identifiant et nom réduits à leur basename : pas de sortie du magasin
+        chemin = os.path.join(self.dossier, os.path.basename(lot_id))
+        return os.path.join(chemin, os.path.basename(nom)) if nom else chemin
+
+    def nouveau_lot(self):
+        """
+        Crée un lot vide (après une purge, pour faire de la place).
+        """
+        self.purger()
+        lot_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._en_ecriture.add(lot_id)
+        return LotDisque(self, lot_id)
+
+    def liberer(self, lot_id):
+        with self._lock:
+            self._en_ecriture.discard(lot_id)
+        self.purger()
+
+    def _toucher(self, lot_id):
+        # Date de dernier accès = mtime du dossier (ordre LRU)
+        try:
+            os.utime(self.chemin(lot_id))
+        except OSError:
+            pass
+
+    def infos(self, lot_id):
+        """
+        {fichiers, archive, cree} d'un lot terminé, ou None (inconnu / expiré).
+        """
+        try:
+            with open(self.chemin(lot_id, META), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._toucher(lot_id)
+        return meta
+
+    def lire(self, lot_id, nom):
+        """
+        bytes d'un fichier du lot (téléchargement : lu au clic seulement).
+        """
+        self._toucher(lot_id)
+        with open(self.chemin(lot_id, nom), "rb") as f:
+            return f.read()
+
+    def lire_zip(self, lot_id):
+        """
+        ZIP de tout le lot, construit sur disque au 1er appel puis réutilisé.
+        """
+        infos = self.infos(lot_id)
+        if infos is None:
+            raise FileNotFoundError(f"Lot {lot_id} expiré")
+        chemin = self.chemin(lot_id, ZIP_LOT)
+        if not os.path.exists(chemin):
+            temp = chemin + ".part"
+            with zipfile.ZipFile(temp, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+                for nom in infos["fichiers"]:
+                    zf.write(self.chemin(lot_id, nom), nom)
+            os.replace(temp, chemin)
+        return self.lire(lot_id, ZIP_LOT)
+
+    def purger(self):
+        """
+        Supprime les lots expirés, puis les moins récemment utilisés tant que
+        le quota est dépassé. Les lots en cours d'écriture sont épargnés.
+        """
+        try:
+            entrees = list(os.scandir(self.dossier))
+        except FileNotFoundError:
+            return
+        with self._lock:
+            en_ecriture = set(self._en_ecriture)
+        limite = time.time() - self.ttl
+        lots = []
+        for entree in entrees:
+            if not entree.is_dir() or entree.name in en_ecriture:
+                continue
+            try:
+                acces = entree.stat().st_mtime
+                taille = sum(f.stat().st_size for f in os.scandir(entree.path) if f.is_file())
+            except OSError:
+                continue
+            if acces < limite:
+                shutil.rmtree(entree.path, ignore_errors=True)
+            else:
+                lots.append((acces, taille, entree.path))
+
+        total = sum(taille for _, taille, _ in lots)
+        for _, taille, chemin in sorted(lots):
+            if total <= self.quota:
+                break
+            shutil.rmtree(chemin, ignore_errors=True)
+            total -= taille
+
+
+_MAGASIN = None
+_MAGASIN_LOCK = threading.Lock()
+
+
+def get_magasin():
+    """
+    Magasin unique au processus (partagé par toutes les sessions).
+    """
+    global _MAGASIN
+    with _MAGASIN_LOCK:
+        if _MAGASIN is None:
+            _MAGASIN = MagasinLots()
+        return _MAGASIN
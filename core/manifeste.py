@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Manifeste local des envois SFTP en cours, pour reprendre un lot interrompu.
+
+Un fichier JSON-lines par cible (host/dir), en ajout seul : une ligne par
+changement d'état d'un fichier ("transfere" = écrit sous son nom temporaire,
+"valide" = renommé sous son nom final, "echec" = à renvoyer). Au lancement
+suivant, les fichiers déjà transférés ou validés ne sont pas renvoyés.
+Le manifeste d'un lot terminé sans erreur est purgé : renvoyer le même
+fichier plus tard repart de zéro.
+"""
+
+import json
+import os
+import re
+import threading
+
+DEFAULT_DOSSIER = "manifestes_envoi"
+
+_VERROUS = {}
+_VERROUS_LOCK = threading.Lock()
+
+
+def _verrou(chemin):
+    # Un verrou par fichier, partagé par tous les Manifeste du processus
+    with _VERROUS_LOCK:
+        return _VERROUS.setdefault(chemin, threading.Lock())
+
+
+class Manifeste:
+    def __init__(self, cible, dossier=None):
+        dossier = dossier or os.environ.get("MANIFESTE_DIR", DEFAULT_DOSSIER)
+        self.chemin = os.path.join(dossier, re.sub(r'[^A-Za-z0-9._-]+', '_', cible) + ".jsonl")
+        self._lock = _verrou(self.chemin)
+        with self._lock:
+            self._entrees = self._charger()
+
+    def _charger(self):
+        entrees = {}
+        try:
+            with open(self.chemin, encoding="utf-8") as f:
+                for ligne in f:
+                    try:
+                        champs = json.loads(ligne)
+                    except ValueError:
+                        continue  # dernière ligne tronquée (arrêt pendant l'écriture)
+                    cle = champs.pop("cle")
+                    entrees.setdefault(cle, {}).update(champs)
+        except FileNotFoundError:
+            pass
+        return entrees
+
+    def etat(self, cle):
+        """
+        Dernier état connu du fichier `cle` (dict avec au moins "etat"), ou None.
+        """
+        entree = self._entrees.get(cle)
+        if entree is None or entree.get("etat") == "echec":
+            return None
+        return dict(entree)
+
+    def noter(self, cle, **champs):
+        with self._lock:
+            self._entrees.setdefault(cle, {}).update(champs)
+            os.makedirs(os.path.dirname(self.chemin) or ".", exist_ok=True)
+            with open(self.chemin, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"cle": cle, **champs}, ensure_ascii=False) + "\n")
+
+    def purger(self, cles):
+        """
+        Retire `cles` du manifeste (relu sur disque : un autre lot vers la même
+        cible a pu y écrire entre-temps).
+        """
+        cles = set(cles)
+        with self._lock:
+            entrees = self._charger()
+            for cle in cles:
+                entrees.pop(cle, None)
+                self._entrees.pop(cle, None)
+            if not entrees:
+                try:
+                    os.remove(self.chemin)
+                except FileNotFoundError:
+                    pass
+                return
+            tmp = self.chemin + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for cle, champs in entrees.items():
+                    f.write(json.dumps({"cle": cle, **champs}, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.chemin)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation des étapes d'un envoi (lecture CSV, génération, to_csv,
+connexion SSH, putfo...) : durées cumulées, octets, fichiers/s.
+Affiché dans le panneau "Performance" des pages, et optionnellement ajouté
+à un journal JSON-lines (variable d'environnement METRICS_LOG).
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+# Étapes qui comptent comme "fichier envoyé" (SFTP ou dossier local)
+ETAPES_ENVOI = ("putfo", "write_local")
+
+
+class Mesures:
+    def __init__(self, page):
+        self.page = page
+        self.debut = datetime.now()
+        self._t0 = time.perf_counter()
+        self._etapes = {}               # nom -> cumuls (ordre d'apparition conservé)
+        self._lock = threading.Lock()   # les envois parallèles enregistrent depuis leurs threads
+
+    def ajouter(self, etape, secondes, octets=0, fichiers=0):
+        with self._lock:
+            e = self._etapes.setdefault(etape, {"seconds": 0.0, "calls": 0, "bytes": 0, "files": 0})
+            e["seconds"] += secondes
+            e["calls"] += 1
+            e["bytes"] += octets
+            e["files"] += fichiers
+
+    @contextmanager
+    def chrono(self, etape, octets=0, fichiers=0):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.ajouter(etape, time.perf_counter() - t0, octets, fichiers)
+
+    def etapes(self):
+        """
+        Une ligne par étape (durée cumulée, tous threads confondus).
+        """
+        with self._lock:
+            items = [(nom, dict(e)) for nom, e in self._etapes.items()]
+        lignes = []
+        for nom, e in items:
+            s = e["seconds"]
+            lignes.append({
+                "etape": nom,
+                "seconds": round(s, 4),
+                "calls": e["calls"],
+                "bytes": e["bytes"],
+                "files": e["files"],
+                "files_per_s": round(e["files"] / s, 1) if s and e["files"] else None,
+                "mb_per_s": round(e["bytes"] / s / 1e6, 3) if s and e["bytes"] else None,
+            })
+        return lignes
+
+    def resume(self):
+        mur = time.perf_counter() - self._t0
+        etapes = self.etapes()
+        envoyes = sum(e["files"] for e in etapes if e["etape"] in ETAPES_ENVOI)
+        return {
+            "page": self.page,
+            "ts": self.debut.isoformat(timespec="seconds"),
+            "wall_seconds": round(mur, 4),
+            "files_sent": envoyes,
+            "files_per_s": round(envoyes / mur, 1) if mur and envoyes else None,
+            "stages": etapes,
+        }
+
+    def ecrire_jsonl(self, chemin=None):
+        """
+        Ajoute le résumé au journal JSON-lines (METRICS_LOG par défaut). Sans chemin : rien.
+        """
+        chemin = chemin or os.environ.get("METRICS_LOG")
+        if not chemin:
+            return None
+        resume = self.resume()
+        with open(chemin, "a", encoding="utf-8") as f:
+            f.write(json.dumps(resume, ensure_ascii=False) + "\n")
+        return resume
+
+
+def chrono(mesures, etape, octets=0, fichiers=0):
+    """
+    mesures.chrono(...) si des mesures sont demandées, sinon contexte vide.
+    """
+    if mesures is None:
+        return nullcontext()
+    return mesures.chrono(etape, octets, fichiers)
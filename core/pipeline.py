@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Chaîne complète d'un lot de commandes : génération des OU_EXP, archive
+éventuelle, envoi SFTP atomique, historique des envois incrémentaux.
+
+Fonction pure (aucun appel st.*) : appelée par la page en tâche de fond,
+et utilisable telle quelle hors Streamlit (benchmarks, scripts).
+"""
+
+import os
+import shutil
+import time
+from itertools import chain
+
+from core.bundle import ArchiveLot
+from core.generation import iter_csv_par_commande
+from core.metrics import Mesures
+from core.sftp import DEFAULT_BLOC, envoyer_lot
+
+
+def _noter_origine(fichiers, origine):
+    """
+    (nom, BytesIO, label) -> (nom, BytesIO), en retenant origine[nom] = label.
+    """
+    for nom, buffer, label in fichiers:
+        origine[nom] = label
+        yield nom, buffer
+
+
+def ecrire_dossier(fichiers, dossier, mesures=None, progression=None):
+    """
+    Équivalent local de core.sftp.envoyer_lot : chaque fichier est écrit en
+    flux sous un nom temporaire (".nom.N.part"), puis tout le lot est renommé
+    à la fin (os.replace, atomique). Deux fichiers du même nom : le dernier
+    l'emporte, comme en SFTP. Renvoie (ok, msg, noms écrits).
+    """
+    os.makedirs(dossier, exist_ok=True)
+    temporaires = []
+    try:
+        for numero, (nom, buffer) in enumerate(fichiers, 1):
+            temp = os.path.join(dossier, f".{nom}.{numero}.part")
+            t0 = time.perf_counter()
+            with open(temp, "wb") as f:
+                if hasattr(buffer, "getvalue"):
+                    octets = f.write(buffer.getvalue())
+                else:
+                    # archive déjà sur disque : copie par blocs
+                    buffer.seek(0)
+                    shutil.copyfileobj(buffer, f, DEFAULT_BLOC)
+                    octets = f.tell()
+            if mesures is not None:
+                mesures.ajouter("write_local", time.perf_counter() - t0, octets, 1)
+            temporaires.append((nom, temp))
+            if progression is not None:
+                progression(True, nom)
+        for nom, temp in temporaires:
+            os.replace(temp, os.path.join(dossier, nom))
+    except OSError as e:
+        for _, temp in temporaires:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+        return False, str(e), []
+    noms = list(dict.fromkeys(nom for nom, _ in temporaires))
+    return True, f"{len(noms)} fichier(s) écrit(s) dans {dossier}", noms
+
+
+def envoyer_commandes(df, options, sftp_cfg, archive_format=None, archive_seule=False,
+                      lecture=None, historique=None, progression=None, dossier=None,
+                      archive_dossier=None, nom_mesures="envoi_etats_de_commande", lot=None):
+    """
+    Génération + envoi SFTP d'un lot de commandes, sans Streamlit.
+    df: DataFrame source ou itérable de blocs (cf. core.source)
+    options: paramètres de iter_csv_par_commande (états, transporteurs, mode...)
+    archive_format: None, "zip" ou "tar.gz" ; archive_seule -> seule l'archive est envoyée
+    lecture: (secondes, octets) de la lecture du CSV, reportés dans les mesures
+    historique: HistoriqueEnvois -> envoi incrémental (commandes nouvelles ou modifiées)
+    progression: callback(ok, nom) après chaque fichier (ex : Job.avancer)
+    dossier: écrire dans ce dossier local au lieu d'envoyer en SFTP
+    archive_dossier: archive écrite sur disque dans ce dossier (sinon en mémoire)
+    lot: core.lots.LotDisque -> copie de chaque fichier (et de l'archive) dans
+         le magasin des lots, pour les téléchargements ; fermé en fin d'envoi
+
+    Renvoie un dict : ok, msg, premier_fichier, archive, perf, [lot], [avertissement],
+    ou {"ok": False, "vide": True, "msg": ...} si rien à envoyer.
+    """
+    mesures = Mesures(nom_mesures)
+    if lecture is not None:
+        mesures.ajouter("read_csv", lecture[0], lecture[1])
+
+    cles = None
+    origine = {}
+    if historique is not None:
+        with mesures.chrono("delta_filter"):
+            df, cles = historique.filtrer(df)
+        fichiers = _noter_origine(
+            iter_csv_par_commande(df=df, mesures=mesures, avec_index=True, **options), origine
+        )
+    else:
+        fichiers = iter_csv_par_commande(df=df, mesures=mesures, **options)
+
+    if lot is not None:
+        try:
+            return _envoyer(fichiers, origine, cles, mesures, sftp_cfg, archive_format, archive_seule,
+                            historique, progression, dossier, archive_dossier, lot)
+        finally:
+            lot.fermer()    # sans effet si déjà fermé ; lot vide ou en erreur : simplement purgé plus tard
+    return _envoyer(fichiers, origine, cles, mesures, sftp_cfg, archive_format, archive_seule,
+                    historique, progression, dossier, archive_dossier, lot)
+
+
+def _envoyer(fichiers, origine, cles, mesures, sftp_cfg, archive_format, archive_seule,
+             historique, progression, dossier, archive_dossier, lot):
+    # 1er fichier gardé pour le téléchargement
+    premier_fichier = next(fichiers, None)
+    if premier_fichier is None:
+        if historique is not None:
+            return {"ok": False, "vide": True, "msg": "Aucune commande nouvelle ou modifiée depuis le dernier envoi."}
+        return {"ok": False, "vide": True, "msg": "Aucune ligne valide à exporter (vérifie le fichier source)."}
+
+    flux = chain([premier_fichier], fichiers)
+    if lot is not None:
+        flux = lot.tee(flux, mesures)
+        archive_dossier = archive_dossier or lot.dossier
+    archive = ArchiveLot(archive_format, dossier=archive_dossier) if archive_format else None
+
+    def envoyer(lot):
+        if dossier is not None:
+            return ecrire_dossier(lot, dossier, mesures, progression)
+        return envoyer_lot(lot, sftp_cfg, mesures, progression)
+
+    if archive is not None and archive_seule:
+        # Tout le lot dans une seule archive, envoyée en un fichier
+        for nom, buffer in flux:
+            archive.ajouter(nom, buffer)
+        ok, msg, envoyes = envoyer([(archive.nom, archive.fermer())])
+        if ok:
+            envoyes = list(origine)  # l'archive contient toutes les commandes
+    else:
+        if archive is not None:
+            flux = archive.tee(flux)  # copie locale de chaque fichier envoyé
+        ok, msg, envoyes = envoyer(flux)
+        if archive is not None:
+            archive.fermer()
+    if lot is not None:
+        if archive is not None and archive_dossier == lot.dossier:
+            archive.out.close()
+        lot.fermer(archive.nom if archive is not None and archive_dossier == lot.dossier else None)
+
+    if historique is not None:
+        # Seules les commandes réellement envoyées entrent dans l'historique
+        historique.enregistrer(
+            (*cles[origine[nom]], nom) for nom in envoyes if nom in origine
+        )
+
+    resultat = {
+        "ok": bool(ok),
+        "msg": (msg or "") + (
+            f" ({len(origine)} commande(s) nouvelle(s) ou modifiée(s))" if historique is not None else ""
+        ),
+        "premier_fichier": premier_fichier,
+        "archive": (archive.nom, archive.out) if archive is not None else None,
+        "perf": mesures.resume(),
+    }
+    if lot is not None:
+        resultat["lot"] = lot.id
+    try:
+        mesures.ecrire_jsonl()
+    except OSError as e:
+        resultat["avertissement"] = f"Journal de métriques non écrit : {e}"
+    return resultat
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+Référentiel BOSS : états de commande et transporteurs proposés par la page.
+
+Module sans dépendance : la page l'importe au premier affichage, sans
+charger pandas / numpy (core.generation n'est importé qu'à l'envoi).
+"""
+
+# =============================
+# États possibles
+# =============================
+ETATS = [
+    "Delete",
+    "En attente de paiement",
+    "En cours de preparation",
+    "En cours de reapprovisionnement",
+    "En cours de traitement",
+    "En cours de livraison",
+    "En traitement"
+]
+
+# =============================
+# Transporteurs possibles
+# =============================
+TRANSPORTEURS = [
+    {"nom": "Chronopost", "id": "1220", "tracking": "XR475205445TS"},
+    {"nom": "Colissimo",  "id": "1524", "tracking": "6A03567806597"},
+    {"nom": "Dachser",    "id": "4414", "tracking": "AG01868943"},
+    {"nom": "Geodis",     "id": "2187", "tracking": "1G4T32SZTQL4"},
+]
@@ -0,0 +1,674 @@
+# -*- coding: utf-8 -*-
+"""
+Pool de connexions SFTP partagé par les pages Streamlit.
+
+Une connexion SSH (handshake + auth) coûte plus cher que l'envoi de quelques
+petits fichiers : on garde donc les sessions ouvertes entre les clics, dans
+un pool unique au processus (clé host/user/dir).
+"""
+
+import hashlib
+import re
+import stat
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+from core.manifeste import Manifeste
+from core.metrics import chrono
+
+DEFAULT_PORT = 22
+DEFAULT_MAX_SESSIONS = 4      # sessions SSH ouvertes en même temps (par pool)
+DEFAULT_KEEPALIVE = 30        # secondes entre deux keepalive SSH
+DEFAULT_CONCURRENCY = 1       # envois simultanés (1 = séquentiel)
+DEFAULT_RETRIES = 3           # nouvelles tentatives par fichier
+DEFAULT_BACKOFF = 0.5         # secondes, doublé à chaque tentative
+DEFAULT_BLOC = 1024 * 1024    # octets par écriture SFTP (découpés en requêtes de 32 Ko)
+
+# Profils de réglage SSH (clé "profil_ssh" de la config) ; les clés compression,
+# window_size, max_packet_size, ciphers de la config priment sur le profil.
+# Profil vide = réglages par défaut de paramiko. window_size / max_packet_size
+# règlent ce que le serveur peut nous envoyer d'une traite (réponses, listings) :
+# en envoi, c'est la fenêtre annoncée par le serveur qui borne le débit.
+# Comparaison : python -m benchmarks.bench_ssh
+PROFILS_SSH = {
+    "defaut": {},
+    "texte": {"compression": True},                                 # lots de CSV OU_EXP
+    "latence": {"window_size": 16 * 1024 * 1024, "max_packet_size": 64 * 1024},
+    "wan": {"compression": True, "window_size": 16 * 1024 * 1024, "max_packet_size": 64 * 1024},
+}
+
+# Horodatage des noms OU_EXP (cf. core.generation._serialiser), juste avant l'extension
+_HORODATAGE = re.compile(r"_\d{14}(?=\.[^.]*$|$)")
+
+
+def _booleen(val):
+    if isinstance(val, str):
+        return val.strip().lower() in ("1", "true", "oui", "yes", "on")
+    return bool(val)
+
+
+def reglages_ssh(cfg):
+    """
+    Réglages du transport SSH : profil nommé + clés explicites de la config
+    (secrets ou variables SFTP_*, donc éventuellement en texte).
+    Renvoie un dict avec uniquement les réglages à appliquer :
+    compression (bool), window_size / max_packet_size (int), ciphers (tuple).
+    """
+    profil = cfg.get("profil_ssh") or "defaut"
+    if profil not in PROFILS_SSH:
+        raise ValueError(f"Profil SSH inconnu : {profil} (choix : {', '.join(PROFILS_SSH)})")
+    reglages = dict(PROFILS_SSH[profil])
+    if cfg.get("compression") not in (None, ""):
+        reglages["compression"] = _booleen(cfg["compression"])
+    for cle in ("window_size", "max_packet_size"):
+        if cfg.get(cle):
+            reglages[cle] = int(cfg[cle])
+    ciphers = cfg.get("ciphers")
+    if ciphers:
+        if isinstance(ciphers, str):
+            ciphers = ciphers.split(",")
+        reglages["ciphers"] = tuple(c.strip() for c in ciphers if c.strip())
+    return reglages
+
+
+# =============================
+# Pool de sessions
+# =============================
+class SFTPPool:
+    def __init__(self, host, user, pwd, max_sessions=DEFAULT_MAX_SESSIONS,
+                 keepalive=DEFAULT_KEEPALIVE, port=DEFAULT_PORT, ssh=None):
+        """
+        ssh: réglages du transport (cf. reglages_ssh), appliqués à chaque connexion
+        """
+        self.host = host
+        self.user = user
+        self.pwd = pwd
+        self.port = port
+        self.keepalive = keepalive
+        self.max_sessions = max_sessions
+        self.ssh = dict(ssh or {})
+        self._idle = []                     # [((transport, sftp), rendue à)] prêtes à servir
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_sessions)
+        self._dossiers = set()              # dossiers distants déjà vérifiés
+
+    def _connect(self):
+        # Import différé : paramiko n'est chargé qu'à la 1re connexion, pas à
+        # l'affichage des pages
+        import paramiko
+
+        fenetres = {
+            f"default_{cle}": self.ssh[cle] for cle in ("window_size", "max_packet_size") if cle in self.ssh
+        }
+        transport = paramiko.Transport((self.host, self.port), **fenetres)
+        try:
+            # À régler avant la négociation (connect)
+            if "compression" in self.ssh:
+                transport.use_compression(self.ssh["compression"])
+            if self.ssh.get("ciphers"):
+                # Ordre de préférence ; ValueError si un algorithme est inconnu de paramiko
+                transport.get_security_options().ciphers = self.ssh["ciphers"]
+            transport.connect(username=self.user, password=self.pwd)
+            if self.keepalive:
+                transport.set_keepalive(self.keepalive)
+            sftp = paramiko.SFTPClient.from_transport(transport)
+        except Exception:
+            transport.close()
+            raise
+        return transport, sftp
+
+    @staticmethod
+    def _close(conn):
+        transport, sftp = conn
+        for obj in (sftp, transport):
+            try:
+                obj.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_alive(transport, sonder=False):
+        # Le keepalive fait tomber le transport si le serveur ne répond plus.
+        # `sonder` : send_ignore détecte en plus une socket coupée sans
+        # aller-retour, mais coûte ~40 ms (Nagle + ACK retardé) : réservé aux
+        # sessions restées inactives plus longtemps que le keepalive.
+        if not transport.is_active():
+            return False
+        if not sonder:
+            return True
+        try:
+            transport.send_ignore()
+        except Exception:
+            return False
+        return True
+
+    def _rendre(self, conn):
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    def _checkout(self, mesures=None):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, rendue = self._idle.pop()
+            inactive = time.monotonic() - rendue > (self.keepalive or DEFAULT_KEEPALIVE)
+            if self._is_alive(conn[0], sonder=inactive):
+                return conn
+            self._close(conn)  # session périmée -> reconnexion transparente
+        with chrono(mesures, "ssh_connect"):
+            return self._connect()
+
+    @contextmanager
+    def session(self, mesures=None):
+        """
+        Emprunte un client SFTP au pool (bloque si max_sessions sont déjà utilisées).
+        Après une erreur, la session n'est remise dans le pool que si le
+        transport est toujours vivant (ex. simple erreur de chemin distant).
+        """
+        self._slots.acquire()
+        try:
+            conn = self._checkout(mesures)
+            try:
+                yield conn[1]
+            except BaseException:
+                if self._is_alive(conn[0]):
+                    self._rendre(conn)
+                else:
+                    self._close(conn)
+                raise
+            self._rendre(conn)
+        finally:
+            self._slots.release()
+
+    def assurer_dossier(self, dir_remote, mesures=None):
+        """
+        Vérifie que le dossier distant existe (un stat), le crée sinon (un mkdir).
+        Le résultat est mémorisé pour la vie du pool : les envois suivants ne
+        font plus aucun aller-retour. Un échec n'est pas mémorisé.
+        Renvoie True si le dossier est en place.
+        """
+        if dir_remote in self._dossiers:
+            return True
+        with self.session(mesures) as sftp, chrono(mesures, "verif_dossier"):
+            try:
+                ok = stat.S_ISDIR(sftp.stat(dir_remote).st_mode)
+            except IOError:
+                try:
+                    sftp.mkdir(dir_remote)
+                    ok = True
+                except IOError:
+                    # créé entre-temps par un autre envoi ?
+                    try:
+                        ok = stat.S_ISDIR(sftp.stat(dir_remote).st_mode)
+                    except IOError:
+                        ok = False
+        if ok:
+            with self._lock:
+                self._dossiers.add(dir_remote)
+        return ok
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+
+
+# =============================
+# Registre process-wide
+# =============================
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(sftp_cfg):
+    """
+    Renvoie le pool associé à (host, port, user, dir, réglages SSH), créé au premier appel.
+    """
+    port = int(sftp_cfg.get("port") or DEFAULT_PORT)
+    ssh = reglages_ssh(sftp_cfg)
+    key = (sftp_cfg.get("host"), port, sftp_cfg.get("user"), sftp_cfg.get("dir", "refonteTest"),
+           tuple(sorted(ssh.items())))
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = SFTPPool(
+                sftp_cfg.get("host"),
+                sftp_cfg.get("user"),
+                sftp_cfg.get("pass"),
+                max_sessions=int(sftp_cfg.get("max_sessions") or DEFAULT_MAX_SESSIONS),
+                keepalive=int(sftp_cfg.get("keepalive") or DEFAULT_KEEPALIVE),
+                port=port,
+                ssh=ssh,
+            )
+            _POOLS[key] = pool
+    return pool
+
+
+def cible_sftp(sftp_cfg):
+    """
+    Identifiant d'une cible d'envoi (serveur / répertoire), pour les index locaux.
+    """
+    return f"{sftp_cfg.get('host')}/{sftp_cfg.get('dir', 'refonteTest')}"
+
+
+# =============================
+# Envoi parallèle avec reprise par fichier
+# =============================
+def envoyer_flux(sftp, fichier, remote_path, taille_bloc=DEFAULT_BLOC):
+    """
+    Équivalent de putfo sans copie : le fichier est écrit en blocs de taille
+    fixe, écritures SFTP pipelinées (pas d'attente d'accusé entre deux blocs).
+
+    BytesIO / UploadedFile : les blocs sont des tranches d'un memoryview sur
+    le contenu du fichier, rien n'est recopié côté Python. Autres objets
+    (membre de ZIP, fichier disque) : lecture par readinto dans un tampon
+    réutilisé, mémoire bornée à `taille_bloc`.
+
+    Renvoie le nombre d'octets envoyés (taille vérifiée par stat, comme putfo).
+    """
+    with sftp.open(remote_path, "wb") as distant:
+        distant.set_pipelined(True)
+        if hasattr(fichier, "getvalue"):
+            # getvalue() rend le bytes interne du BytesIO sans le recopier
+            # (getbuffer() forcerait au contraire une copie du contenu d'un
+            # UploadedFile, partagé avec les données reçues par Streamlit)
+            with memoryview(fichier.getvalue()) as vue:
+                envoye = vue.nbytes
+                for debut in range(0, envoye, taille_bloc):
+                    distant.write(vue[debut:debut + taille_bloc])
+        else:
+            fichier.seek(0)
+            tampon = bytearray(taille_bloc)
+            envoye = 0
+            with memoryview(tampon) as vue:
+                while True:
+                    n = fichier.readinto(tampon)
+                    if not n:
+                        break
+                    distant.write(vue[:n])
+                    envoye += n
+    taille = sftp.stat(remote_path).st_size
+    if taille != envoye:
+        raise IOError(f"Taille incohérente après envoi de {remote_path} : {taille} != {envoye}")
+    return envoye
+
+
+def _put_with_retry(pool, buffer, remote_path, retries, backoff, mesures=None):
+    erreur = None
+    for tentative in range(retries + 1):
+        try:
+            with pool.session(mesures) as sftp:
+                t0 = time.perf_counter()
+                octets = envoyer_flux(sftp, buffer, remote_path)
+                if mesures is not None:
+                    mesures.ajouter("putfo", time.perf_counter() - t0, octets, 1)
+            return None
+        except Exception as e:
+            erreur = e
+            if tentative < retries:
+                time.sleep(backoff * 2 ** tentative)
+    return erreur
+
+
+def upload_parallel(pool, named_blobs, dir_remote, concurrency=DEFAULT_CONCURRENCY,
+                    retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, max_pending=None,
+                    mesures=None):
+    """
+    Envoie les (nom, BytesIO) sur `concurrency` sessions du pool en parallèle.
+    Chaque fichier est retenté individuellement (backoff exponentiel) : un échec
+    n'interrompt pas le lot et les fichiers déjà envoyés ne sont pas renvoyés.
+
+    `named_blobs` peut être un générateur : il n'est consommé qu'au fur et à
+    mesure, avec au plus `max_pending` fichiers en attente ou en cours d'envoi
+    (file bornée, 2 x concurrency par défaut). La mémoire reste constante et
+    le premier envoi part dès le premier fichier produit.
+
+    Générateur : produit (nom, remote_path, erreur) au fil des envois terminés,
+    erreur = None si OK. Le nombre de sessions reste plafonné par max_sessions.
+    """
+    concurrency = max(1, concurrency)
+    max_pending = max_pending or 2 * concurrency
+    items = iter(named_blobs)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        en_cours = {}
+
+        def remplir():
+            while len(en_cours) < max_pending:
+                item = next(items, None)
+                if item is None:
+                    return
+                nom, buffer = item
+                remote_path = f"{dir_remote}/{nom}"
+                fut = executor.submit(_put_with_retry, pool, buffer, remote_path, retries, backoff, mesures)
+                en_cours[fut] = (nom, remote_path)
+
+        remplir()
+        while en_cours:
+            termines, _ = wait(en_cours, return_when=FIRST_COMPLETED)
+            for fut in termines:
+                nom, remote_path = en_cours.pop(fut)
+                yield nom, remote_path, fut.result()
+            remplir()
+
+
+# =============================
+# Lot atomique : noms temporaires puis renommage groupé
+# =============================
+def nom_stable(nom):
+    """
+    Nom sans l'horodatage de génération (OU_EXP_<ref>_<AAAAMMJJhhmmss>.csv) :
+    la même commande régénérée à la relance d'un lot garde le même nom stable.
+    """
+    return _HORODATAGE.sub("", nom)
+
+
+def nom_temporaire(nom, numero=0):
+    # "." + ".part" : ignoré par les crons qui cherchent OU_EXP_* / OU_FACT_* / FACT_*
+    # numero : distingue deux fichiers du même nom dans un lot
+    return f".{nom}.{numero}.part" if numero else f".{nom}.part"
+
+
+def empreinte_fichier(nom, fichier):
+    """
+    Clé du fichier dans le manifeste : empreinte du contenu pour les buffers
+    en mémoire, nom du fichier pour les flux (membres de ZIP) qu'on ne relit pas.
+    """
+    if hasattr(fichier, "getvalue"):
+        with memoryview(fichier.getvalue()) as vue:
+            return hashlib.sha1(vue).hexdigest()
+    return f"nom:{nom}"
+
+
+def _renommer(sftp, source, cible):
+    try:
+        # Remplace la cible de façon atomique (extension OpenSSH)
+        sftp.posix_rename(source, cible)
+    except IOError:
+        # Serveur sans posix-rename : le rename SFTPv3 refuse d'écraser
+        sftp.stat(source)  # source absente -> on ne touche pas à la cible
+        try:
+            sftp.remove(cible)
+        except IOError:
+            pass
+        sftp.rename(source, cible)
+
+
+def envoyer_atomique(pool, dir_remote, nom, fichier, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                     mesures=None):
+    """
+    Un fichier écrit sous nom temporaire puis renommé aussitôt : visible sous
+    son nom final dès qu'il est complet, sans attendre le reste d'un lot
+    (envoi au fil de l'eau, cf. core.charge). Lève l'erreur après `retries`.
+    """
+    temp_path = f"{dir_remote}/{nom_temporaire(nom)}"
+    erreur = _put_with_retry(pool, fichier, temp_path, retries, backoff, mesures)
+    if erreur is not None:
+        raise erreur
+    with pool.session(mesures) as sftp:
+        _renommer(sftp, temp_path, f"{dir_remote}/{nom}")
+
+
+class LotAtomique:
+    """
+    Envoi d'un lot en deux phases :
+    1. transferer() : chaque fichier est écrit sous un nom temporaire
+       (invisible pour la cron), en parallèle, avec reprise par fichier ;
+    2. valider() : renommage groupé sous les noms finaux, sur une session.
+
+    Avec un Manifeste, chaque étape est notée localement : un lot interrompu
+    relancé vers la même cible ne renvoie ni les fichiers déjà transférés
+    (seul le renommage est refait) ni ceux déjà validés.
+    """
+
+    def __init__(self, pool, dir_remote, manifeste=None, mesures=None):
+        self.pool = pool
+        self.dir_remote = dir_remote
+        self.manifeste = manifeste
+        self.mesures = mesures
+        self.reprises = 0               # fichiers non renvoyés grâce au manifeste
+        self.erreurs = 0
+        self._a_valider = OrderedDict()  # nom -> (chemin temporaire, clé)
+        self._valides = []              # (nom, nom distant) déjà validés lors d'un lot interrompu
+        self._cles = []
+        self._numero = 0                # n° de transfert, unique dans le lot
+        self._orphelins = []            # temporaires remplacés par un fichier du même nom
+
+    def transferer(self, named_blobs, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES,
+                   backoff=DEFAULT_BACKOFF, max_pending=None):
+        """
+        Générateur : (nom, remote_path final, erreur) à la fin de chaque transfert.
+        `named_blobs` est consommé en flux, comme pour upload_parallel.
+        """
+        en_attente = {}     # nom temporaire -> (nom, clé)
+        repris = []
+
+        def a_envoyer():
+            for nom, buffer in named_blobs:
+                cle = empreinte_fichier(nom, buffer)
+                self._cles.append(cle)
+                entree = self.manifeste.etat(cle) if self.manifeste is not None else None
+                if entree is not None and nom_stable(entree.get("nom", "")) != nom_stable(nom):
+                    # même contenu destiné à un autre nom final (hors horodatage) :
+                    # renvoyé sous le nouveau nom
+                    if entree["etat"] == "transfere":
+                        self._orphelins.append(entree["temp"])
+                    entree = None
+                if entree is not None:
+                    repris.append((nom, cle, entree))
+                    continue
+                self._numero += 1
+                temp = nom_temporaire(nom, self._numero)
+                en_attente[temp] = (nom, cle)
+                yield temp, buffer
+
+        def reprendre():
+            while repris:
+                nom, cle, entree = repris.pop(0)
+                self.reprises += 1
+                if entree["etat"] == "transfere":
+                    # temporaire en place : renommé sous le nom demandé cette fois-ci
+                    self._a_valider[nom] = (entree["temp"], cle)
+                    yield nom, f"{self.dir_remote}/{nom}", None
+                else:
+                    # déjà validé lors du lot interrompu : en place sous son nom
+                    # d'alors (horodatage d'origine), rien à renvoyer ni renommer
+                    self._valides.append((nom, entree["nom"]))
+                    yield nom, f"{self.dir_remote}/{entree['nom']}", None
+
+        for temp, temp_path, erreur in upload_parallel(
+            self.pool, a_envoyer(), self.dir_remote, concurrency=concurrency,
+            retries=retries, backoff=backoff, max_pending=max_pending, mesures=self.mesures
+        ):
+            yield from reprendre()
+            nom, cle = en_attente.pop(temp)
+            if erreur is None:
+                # même nom déjà transféré dans ce lot : le dernier l'emporte
+                precedent = self._a_valider.pop(nom, None)
+                if precedent is not None:
+                    self._orphelins.append(precedent[0])
+                self._a_valider[nom] = (temp_path, cle)
+                if self.manifeste is not None:
+                    self.manifeste.noter(cle, etat="transfere", nom=nom, temp=temp_path)
+            else:
+                self.erreurs += 1
+            yield nom, f"{self.dir_remote}/{nom}", erreur
+        yield from reprendre()
+
+    def valider(self, noms=None):
+        """
+        Renomme les fichiers transférés (tous, ou seulement `noms`, dans l'ordre
+        de transfert) sous leur nom final. Renvoie [(nom, remote_path, erreur)],
+        fichiers déjà validés lors d'un lot interrompu compris (sans erreur).
+        Le temporaire d'un renommage en échec est supprimé (renvoyé à la reprise).
+        """
+        if noms is None:
+            deja = list(self._valides)
+            noms = list(self._a_valider)
+        else:
+            noms = set(noms)
+            deja = [(n, distant) for n, distant in self._valides if n in noms]
+            noms = [n for n in self._a_valider if n in noms]
+        resultats = [(nom, f"{self.dir_remote}/{distant}", None) for nom, distant in deja]
+        if not noms:
+            return resultats
+        with chrono(self.mesures, "commit", fichiers=len(noms)):
+            with self.pool.session(self.mesures) as sftp:
+                for nom in noms:
+                    temp_path, cle = self._a_valider.pop(nom)
+                    remote_path = f"{self.dir_remote}/{nom}"
+                    try:
+                        _renommer(sftp, temp_path, remote_path)
+                        erreur = None
+                    except Exception as e:
+                        erreur = e
+                        self.erreurs += 1
+                        try:
+                            sftp.remove(temp_path)
+                        except IOError:
+                            pass
+                    if self.manifeste is not None:
+                        self.manifeste.noter(cle, etat="valide" if erreur is None else "echec", nom=nom)
+                    resultats.append((nom, remote_path, erreur))
+                while self._orphelins:
+                    try:
+                        sftp.remove(self._orphelins.pop())
+                    except IOError:
+                        pass
+        return resultats
+
+    def terminer(self):
+        """
+        Fin du lot : les fichiers transférés mais non validés (renommage écarté,
+        ex. contrôle d'un PDF en échec) sont supprimés et notés à renvoyer.
+        Lot entièrement validé sans erreur : ses entrées sont retirées du manifeste.
+        Sinon elles sont gardées pour la reprise.
+        """
+        ecartes = bool(self._a_valider)
+        if self._a_valider or self._orphelins:
+            with self.pool.session(self.mesures) as sftp:
+                while self._a_valider:
+                    nom, (temp_path, cle) = self._a_valider.popitem(last=False)
+                    try:
+                        sftp.remove(temp_path)
+                    except IOError:
+                        pass
+                    if self.manifeste is not None:
+                        self.manifeste.noter(cle, etat="echec", nom=nom)
+                while self._orphelins:
+                    try:
+                        sftp.remove(self._orphelins.pop())
+                    except IOError:
+                        pass
+        if self.manifeste is not None and not self.erreurs and not ecartes:
+            self.manifeste.purger(self._cles)
+
+
+# =============================
+# Envois complets (utilisés par les pages et hors Streamlit)
+# =============================
+def parametres_envoi(sftp_cfg):
+    """
+    (dir_remote, concurrency, retries) d'une config SFTP, ou None si les
+    identifiants manquent.
+    """
+    if not sftp_cfg.get("host") or not sftp_cfg.get("user") or not sftp_cfg.get("pass"):
+        return None
+    concurrency = int(sftp_cfg.get("concurrency") or DEFAULT_CONCURRENCY)
+    retries = sftp_cfg.get("retries")
+    retries = DEFAULT_RETRIES if retries in (None, "") else int(retries)
+    return sftp_cfg.get("dir", "refonteTest"), concurrency, retries
+
+
+def verifier_dossier(pool, dir_remote, mesures=None):
+    # s'assure que le dir existe (best effort : un échec remonte à l'envoi),
+    # sans lister un dossier qui peut contenir des dizaines de milliers de fichiers
+    return pool.assurer_dossier(dir_remote, mesures)
+
+
+def envoyer_lot(fichiers, sftp_cfg, mesures=None, progression=None, manifeste=None):
+    """
+    fichiers: liste ou générateur de tuples (nom, BytesIO), consommé en flux
+    progression: callback(ok, nom) appelé après chaque transfert
+    manifeste: core.manifeste.Manifeste (défaut : celui de la cible)
+
+    Les fichiers sont écrits sous un nom temporaire puis renommés tous ensemble
+    en fin de lot : la cron ne voit jamais de fichier à moitié écrit. Un lot
+    interrompu reprend là où il s'était arrêté.
+    Renvoie (ok, msg, noms des fichiers validés).
+    """
+    try:
+        parametres = parametres_envoi(sftp_cfg)
+        if parametres is None:
+            return False, "Identifiants SFTP manquants", []
+        dir_remote, concurrency, retries = parametres
+
+        # Sessions SSH du pool partagé, `concurrency` transferts en parallèle
+        if manifeste is None:
+            manifeste = Manifeste(cible_sftp(sftp_cfg))
+        lot = LotAtomique(get_pool(sftp_cfg), dir_remote, manifeste, mesures)
+        echecs = []
+        for nom, remote_path, erreur in lot.transferer(fichiers, concurrency=concurrency, retries=retries):
+            if erreur is not None:
+                echecs.append(f"{nom} ({erreur})")
+            if progression is not None:
+                progression(erreur is None, nom)
+
+        # Phase de validation : renommage groupé des fichiers transférés
+        valides = []
+        for nom, remote_path, erreur in lot.valider():
+            if erreur is None:
+                valides.append(nom)
+            else:
+                echecs.append(f"{nom} (renommage : {erreur})")
+        lot.terminer()
+
+        reprise = f" ({lot.reprises} repris d'un envoi interrompu)" if lot.reprises else ""
+        if echecs:
+            apercu = ", ".join(echecs[:10]) + (" …" if len(echecs) > 10 else "")
+            return False, (
+                f"{len(valides)}/{len(valides) + len(echecs)} fichier(s) envoyé(s) vers {dir_remote}{reprise}, "
+                f"{len(echecs)} échec(s) : {apercu} — relancer le lot pour reprendre"
+            ), valides
+        return True, f"{len(valides)} fichier(s) envoyé(s) en SFTP vers {dir_remote}{reprise}", valides
+    except Exception as e:
+        return False, str(e), []
+
+
+def envoyer_blobs(named_blobs, sftp_cfg, mesures=None, manifeste=None):
+    """
+    named_blobs: liste de tuples (remote_filename, fichier) ; fichier = tout objet
+    lisible (BytesIO, UploadedFile...), envoyé en flux par blocs (cf. envoyer_flux)
+
+    Tout ou rien : écriture sous noms temporaires puis renommage dans l'ordre
+    de la liste, seulement si tous les transferts ont réussi.
+    Renvoie (ok, msg).
+    """
+    try:
+        parametres = parametres_envoi(sftp_cfg)
+        if parametres is None:
+            return False, "Identifiants SFTP manquants"
+        dir_remote = parametres[0]
+
+        # Session SSH réutilisée entre les clics (pool partagé entre les pages)
+        pool = get_pool(sftp_cfg)
+        verifier_dossier(pool, dir_remote, mesures)
+        if manifeste is None:
+            manifeste = Manifeste(cible_sftp(sftp_cfg))
+        lot = LotAtomique(pool, dir_remote, manifeste, mesures)
+        for nom, remote_path, erreur in lot.transferer(named_blobs):
+            if erreur is not None:
+                raise erreur
+        for nom, remote_path, erreur in lot.valider():
+            if erreur is not None:
+                raise erreur
+        lot.terminer()
+
+        return True, f"{len(named_blobs)} fichier(s) envoyé(s) sur {dir_remote}"
+    except Exception as e:
+        return False, str(e)
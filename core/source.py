@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+Lecture du fichier source BOSS (export commande) avec cache.
+
+Streamlit ré-exécute la page à chaque interaction : sans cache, le CSV est
+re-parsé à chaque clic. Le DataFrame parsé et filtré est gardé en mémoire,
+indexé par le hash du contenu, avec une éviction LRU bornée en taille.
+"""
+
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024   # mémoire max occupée par les DataFrames en cache
+DEFAULT_MAX_ENTRIES = 8
+
+
+# Seules colonnes utilisées par la génération
+COLONNES_SOURCE = ["Reference", "Quantité", "prixUnitHt", "prixAchatHt", "Code Mistral", "Libellé"]
+
+DEFAULT_CHUNKSIZE = 50_000              # lignes par bloc
+SEUIL_STREAMING = 200 * 1024 * 1024     # au-delà : lecture par blocs, sans cache
+
+
+def _dtype_texte():
+    # Chaînes pyarrow si disponible (compactes), sinon catégories
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "category"
+    return pd.StringDtype("pyarrow")
+
+
+# =============================
+# Lecture + filtre
+# =============================
+def _filtrer(df):
+    if "Code Mistral" in df.columns:
+        df = df[df["Code Mistral"].notna()]
+        df = df[df["Code Mistral"].astype(str).str.strip() != ""]
+    return df
+
+
+def iter_source_chunks(fichier, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Lit le CSV BOSS par blocs de `chunksize` lignes : uniquement les colonnes
+    utiles, lues comme texte (valeurs telles qu'exportées), typées de façon
+    compacte, sans les lignes au "Code Mistral" vide.
+    Les blocs peuvent être passés directement à iter_csv_par_commande.
+    """
+    dtype_texte = _dtype_texte()
+    fichier.seek(0)
+    reader = pd.read_csv(
+        fichier, sep=",", encoding="utf-8",
+        usecols=lambda c: c in COLONNES_SOURCE,
+        dtype=str,
+        chunksize=chunksize,
+    )
+    with reader:
+        for chunk in reader:
+            chunk = _filtrer(chunk)
+            yield chunk.astype({c: dtype_texte for c in chunk.columns})
+
+
+def lire_source(fichier):
+    """
+    Parse le CSV BOSS et ne garde que les lignes avec un "Code Mistral" renseigné.
+    Lecture par blocs : le pic mémoire reste proche de la taille du résultat.
+    """
+    chunks = list(iter_source_chunks(fichier))
+    if not chunks:
+        return pd.DataFrame(columns=COLONNES_SOURCE)
+    if len(chunks) == 1:
+        return chunks[0]
+    df = pd.concat(chunks)
+    if _dtype_texte() == "category":
+        # Catégories différentes d'un bloc à l'autre -> object après concat
+        df = df.astype({c: "category" for c in df.columns})
+    return df
+
+
+def apercu_source(fichier, nrows=5):
+    """
+    Premières lignes du fichier, sans parser le reste.
+    """
+    fichier.seek(0)
+    return pd.read_csv(fichier, sep=",", encoding="utf-8", nrows=nrows)
+
+
+# =============================
+# Contrôle du schéma
+# =============================
+COLONNES_DETAIL = ["Quantité", "prixUnitHt", "prixAchatHt", "Code Mistral", "Libellé"]
+COLONNES_NUMERIQUES = {"Quantité": "quantites", "prixUnitHt": "prix", "prixAchatHt": "prix"}
+
+
+# Nombre seul (virgule décimale déjà remplacée), valeur vide admise
+_NOMBRE = r"(?:[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)?"
+# Prix (cellule sans espaces) ; quantités : espaces admis autour de chaque valeur seulement
+_CELLULE_PRIX = rf"{_NOMBRE}(?:\|{_NOMBRE})*"
+_CELLULE_QUANTITE = rf"\s*{_NOMBRE}\s*(?:\|\s*{_NOMBRE}\s*)*"
+
+
+def _lisible_prix(valeur):
+    # Même lecture que core.generation._to_float_safe
+    try:
+        return math.isfinite(float(valeur.replace("\xa0", "").replace(" ", "").replace(",", ".")))
+    except ValueError:
+        return False
+
+
+def _lisible_quantite(valeur):
+    # Même lecture que core.generation._to_int_safe : "1 000" n'est pas lu comme 1000
+    try:
+        return math.isfinite(float(valeur.replace(",", ".").strip()))
+    except ValueError:
+        return False
+
+
+# Par genre : (nettoyage de la cellule, expression de la cellule nettoyée, lecture d'une valeur)
+LECTURES = {
+    "prix": (
+        lambda s: (s.str.replace("\xa0", "", regex=False).str.replace(" ", "", regex=False)
+                   .str.replace(",", ".", regex=False)),
+        _CELLULE_PRIX, _lisible_prix,
+    ),
+    "quantites": (lambda s: s.str.replace(",", ".", regex=False), _CELLULE_QUANTITE, _lisible_quantite),
+}
+
+
+def _nb_valeurs(s):
+    # Nombre de valeurs pipe par cellule (cellule vide -> NaN, ignorée)
+    return (s.str.len() - s.str.replace("|", "", regex=False).str.len()).astype("float64") + 1
+
+
+def _valeurs_invalides(s, genre):
+    """
+    Valeurs illisibles d'une colonne pipe, lues comme par la génération (qui
+    les remplace silencieusement par 0 / 1). Série indexée par ligne.
+    Filtre d'abord les cellules entières par expression régulière : seules
+    les cellules suspectes sont éclatées et relues valeur par valeur.
+    """
+    nettoyer, motif, lisible = LECTURES[genre]
+    s = s.dropna()
+    suspectes = ~nettoyer(s).str.fullmatch(motif).astype(bool)
+    if not suspectes.any():
+        return s.iloc[:0]
+    valeurs = s[suspectes].astype(object).str.split("|").explode().str.strip()
+    valeurs = valeurs[valeurs.notna() & (valeurs != "")]
+    return valeurs[~valeurs.map(lisible).astype(bool)]
+
+
+def valider_source(fichier, chunksize=DEFAULT_CHUNKSIZE, max_exemples=10):
+    """
+    Contrôle le fichier source avant génération, par blocs et en colonnes :
+    colonnes manquantes, nombre de valeurs pipe différent d'une colonne
+    détail à l'autre (la génération complète par des vides), prix et
+    quantités illisibles (remplacés par 0 / 1).
+    Les n° de ligne des exemples sont ceux du fichier (en-tête = ligne 1).
+    Renvoie un dict : ok, lignes, colonnes_manquantes, pipes_incoherents,
+    prix_invalides, quantites_invalides, exemples.
+    """
+    fichier.seek(0)
+    colonnes = list(pd.read_csv(fichier, sep=",", encoding="utf-8", nrows=0).columns)
+    rapport = {
+        "lignes": 0,
+        "colonnes_manquantes": [c for c in COLONNES_SOURCE if c not in colonnes],
+        "pipes_incoherents": 0,
+        "prix_invalides": 0,
+        "quantites_invalides": 0,
+        "exemples": [],
+    }
+    exemples = rapport["exemples"]
+
+    def noter(lignes, texte):
+        for label, detail in lignes[:max(0, max_exemples - len(exemples))]:
+            exemples.append(f"ligne {int(label) + 2} : {texte(detail)}")
+
+    for bloc in iter_source_chunks(fichier, chunksize):
+        rapport["lignes"] += len(bloc)
+        detail = [c for c in COLONNES_DETAIL if c in bloc.columns]
+        if len(detail) > 1:
+            comptes = pd.DataFrame({c: _nb_valeurs(bloc[c]) for c in detail})
+            ecart = comptes.max(axis=1) != comptes.min(axis=1)
+            rapport["pipes_incoherents"] += int(ecart.sum())
+            fautifs = comptes[ecart].head(max_exemples)
+            noter(list(zip(fautifs.index, fautifs.to_dict("records"))),
+                  lambda n: "valeurs pipe " + ", ".join(
+                      f"{c}={int(v)}" for c, v in n.items() if v == v))
+        for col, genre in COLONNES_NUMERIQUES.items():
+            if col not in bloc.columns:
+                continue
+            invalides = _valeurs_invalides(bloc[col], genre)
+            rapport[f"{genre}_invalides"] += len(invalides)
+            noter(list(invalides.head(max_exemples).items()), lambda v, col=col: f"{col} illisible {v!r}")
+
+    rapport["ok"] = not (rapport["colonnes_manquantes"] or rapport["pipes_incoherents"]
+                         or rapport["prix_invalides"] or rapport["quantites_invalides"])
+    return rapport
+
+
+def resume_validation(rapport):
+    """
+    Problèmes du rapport de valider_source, une phrase par type.
+    """
+    messages = []
+    if rapport["colonnes_manquantes"]:
+        messages.append(f"Colonne(s) manquante(s) : {', '.join(rapport['colonnes_manquantes'])}")
+    if rapport["pipes_incoherents"]:
+        messages.append(
+            f"{rapport['pipes_incoherents']} ligne(s) avec un nombre de valeurs pipe différent "
+            "d'une colonne détail à l'autre (complétées par des vides)"
+        )
+    if rapport["prix_invalides"]:
+        messages.append(f"{rapport['prix_invalides']} prix illisible(s) (envoyés à 0)")
+    if rapport["quantites_invalides"]:
+        messages.append(f"{rapport['quantites_invalides']} quantité(s) illisible(s) (envoyées à 1)")
+    return messages
+
+
+def hash_contenu(fichier):
+    # getvalue() renvoie les octets partagés sans copie (BytesIO / UploadedFile) ;
+    # getbuffer() forcerait au contraire une copie de tout le contenu
+    if hasattr(fichier, "getvalue"):
+        return hashlib.sha1(fichier.getvalue()).hexdigest()
+    fichier.seek(0)
+    return hashlib.sha1(fichier.read()).hexdigest()
+
+
+# =============================
+# Cache LRU borné en taille
+# =============================
+class SourceCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()       # hash -> (df, taille)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, df):
+        taille = int(df.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            if key in self._entries:
+                self._total -= self._entries.pop(key)[1]
+            if taille > self.max_bytes:
+                return  # trop gros pour le cache : on ne garde rien
+            self._entries[key] = (df, taille)
+            self._total += taille
+            while self._total > self.max_bytes or len(self._entries) > self.max_entries:
+                _, (_, t) = self._entries.popitem(last=False)
+                self._total -= t
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total = 0
+
+
+_CACHE = SourceCache()
+
+
+def charger_source(fichier, cache=_CACHE):
+    """
+    DataFrame filtré du fichier source, re-parsé seulement si le contenu change.
+    Le DataFrame est partagé entre les sessions : ne pas le modifier en place.
+    """
+    key = hash_contenu(fichier)
+    df = cache.get(key)
+    if df is None:
+        df = lire_source(fichier)
+        cache.put(key, df)
+    return df
+
+
+_RAPPORTS = OrderedDict()       # hash -> rapport de valider_source
+_RAPPORTS_LOCK = threading.Lock()
+
+
+def controler_source(fichier):
+    """
+    valider_source, refait seulement si le contenu change (reruns Streamlit).
+    """
+    key = hash_contenu(fichier)
+    with _RAPPORTS_LOCK:
+        rapport = _RAPPORTS.get(key)
+        if rapport is not None:
+            _RAPPORTS.move_to_end(key)
+            return rapport
+    rapport = valider_source(fichier)
+    with _RAPPORTS_LOCK:
+        _RAPPORTS[key] = rapport
+        while len(_RAPPORTS) > DEFAULT_MAX_ENTRIES:
+            _RAPPORTS.popitem(last=False)
+    return rapport
@@ -12,13 +12,18 @@ App Streamlit : simulation export commande BOSS + envoi SFTP
 """
 
 import streamlit as st
-import pandas as pd
-import random
-from datetime import datetime
-from io import BytesIO
-import paramiko
 import os
-import requests
+import time
+
+# Imports légers uniquement : pandas / numpy (core.source, core.pipeline,
+# core.historique) ne sont importés qu'une fois un fichier chargé, paramiko
+# qu'à la première connexion SFTP.
+from core.bundle import FORMATS
+from core.config import get_sftp_config
+from core.jobs import get_runner
+from core.lots import get_magasin
+from core.referentiel import ETATS, TRANSPORTEURS
+from core.sftp import cible_sftp
 
 with st.sidebar:
     st.markdown("## 📦 Envoi états de commande")
@@ -28,47 +33,7 @@ with st.sidebar:
 # =============================
 # Charger les secrets SFTP
 # =============================
-def get_sftp_config():
-    try:
-        sftp_conf = st.secrets["sftp"]
-        return {
-            "host": sftp_conf.get("host"),
-            "user": sftp_conf.get("user"),
-            "pass": sftp_conf.get("pass"),
-            "dir": sftp_conf.get("dir", "refonteTest")
-        }
-    except Exception:
-        return {
-            "host": os.environ.get("SFTP_HOST"),
-            "user": os.environ.get("SFTP_USER"),
-            "pass": os.environ.get("SFTP_PASS"),
-            "dir": os.environ.get("SFTP_DIR", "refonteTest")
-        }
-
-SFTP_CFG = get_sftp_config()
-
-# =============================
-# États possibles
-# =============================
-ETATS = [
-    "Delete",
-    "En attente de paiement",
-    "En cours de preparation",
-    "En cours de reapprovisionnement",
-    "En cours de traitement",
-    "En cours de livraison",
-    "En traitement"
-]
-
-# =============================
-# Transporteurs possibles
-# =============================
-TRANSPORTEURS = [
-    {"nom": "Chronopost", "id": "1220", "tracking": "XR475205445TS"},
-    {"nom": "Colissimo",  "id": "1524", "tracking": "6A03567806597"},
-    {"nom": "Dachser",    "id": "4414", "tracking": "AG01868943"},
-    {"nom": "Geodis",     "id": "2187", "tracking": "1G4T32SZTQL4"},
-]
+SFTP_CFG = get_sftp_config(st.secrets)
 
 # =============================
 # Cron
@@ -83,205 +48,6 @@ CRON_URL = (
 )
 
 
-# =============================
-# Fonction génération fichiers commande
-# =============================
-def generer_csv_par_commande(
-    df,
-    etats: list,
-    transporteurs: list,
-    mode_etat: str,             # "unique" | "cyclique" | "aleatoire"
-    nb_max=None,
-    partiel_active=False,       # True/False
-    partiel_qte=1,              # quantité pour la ligne partielle
-    partiel_etat_a=None,        # état pour la partie partielle
-    partiel_etat_b=None         # état pour le reliquat
-):
-    import re
-
-    no_commande_base = 1873036
-    num_commande = no_commande_base
-    fichiers = []
-    commandes_generees = 0
-
-    # Filtre "Code Mistral" vide
-    if "Code Mistral" in df.columns:
-        df = df[df["Code Mistral"].notna()]
-        df = df[df["Code Mistral"].astype(str).str.strip() != ""]
-
-    # Helpers
-    def split_strip(x):
-        if pd.isna(x):
-            return []
-        return [p.strip() for p in str(x).split("|")]
-
-    def at(lst, i):
-        return lst[i] if i < len(lst) else ""
-
-    def to_float_safe(val):
-        s = str(val).strip().replace("\xa0", "").replace(" ", "").replace(",", ".")
-        try:
-            return float(s)
-        except Exception:
-            return 0.0
-
-    def format_price(val):
-        try:
-            return str(round(to_float_safe(val) / 100, 2)).replace(".", ",")
-        except Exception:
-            return ""
-
-    def to_int_safe(val):
-        try:
-            return int(float(str(val).replace(",", ".").strip()))
-        except Exception:
-            return 0
-
-    # Sélection de l'état selon le mode choisi
-    line_counter = 0
-    def pick_etat():
-        nonlocal line_counter
-        if not etats:
-            return ""
-        if mode_etat == "unique":
-            return etats[0]
-        elif mode_etat == "cyclique":
-            e = etats[line_counter % len(etats)]
-            line_counter += 1
-            return e
-        else:  # "aleatoire"
-            return random.choice(etats)
-
-    for idx, ligne in df.iterrows():
-        if nb_max and commandes_generees >= nb_max:
-            break
-
-        # Tourniquet transporteur
-        t = transporteurs[commandes_generees % len(transporteurs)]
-        transporteur_id = t["id"]
-        tracking_default = t["tracking"]
-
-        # Découpe des champs (pipe)
-        details = split_strip(ligne.get("Reference", ""))
-        qtes    = split_strip(ligne.get("Quantité", ""))
-        pv      = split_strip(ligne.get("prixUnitHt", ""))
-        pa      = split_strip(ligne.get("prixAchatHt", ""))
-        codes   = split_strip(ligne.get("Code Mistral", ""))
-        libs    = split_strip(ligne.get("Libellé", ""))
-
-        n = max(len(details), len(qtes), len(pv), len(pa), len(codes), len(libs)) if any([details, qtes, pv, pa, codes, libs]) else 0
-
-        lignes_export = []
-        no_ligne = 1
-
-        for i in range(n):
-            code_i = at(codes, i)
-            if not str(code_i).strip():
-                continue
-
-            # Quantité d'origine
-            qte_full = to_int_safe(at(qtes, i)) if at(qtes, i) != "" else 0
-            if qte_full <= 0:
-                qte_full = 1  # fallback
-
-            # Prix
-            pv_val = format_price(at(pv, i)) if at(pv, i) != "" else ""
-            pa_val = format_price(at(pa, i)) if at(pa, i) != "" else ""
-
-            # Référence transaction pour nommage
-            no_transaction = at(details, i) or (details[0] if details else str(idx))
-
-            # Fonction pour créer une ligne (avec tracking si "En cours de livraison")
-            def build_line(_etat, _qte):
-                tracking = tracking_default if _etat == "En cours de livraison" else ""
-                return {
-                    "No Transaction": no_transaction,
-                    "No Ligne": _next_no_ligne(),
-                    "No Commande Client": num_commande,
-                    "Etat": _etat,
-                    "No Tracking": tracking,
-                    "No Transporteur": transporteur_id,
-                    "Code article": code_i,
-                    "Désignation": at(libs, i),
-                    "Quantité": str(_qte),
-                    "PV net": pv_val,
-                    "PA net": pa_val
-                }
-
-            # Compteur No Ligne
-            def _next_no_ligne():
-                nonlocal no_ligne
-                cur = no_ligne
-                no_ligne += 1
-                return cur
-
-            # === LOGIQUE PARTIELLE ===
-            if partiel_active and qte_full > partiel_qte:
-                # États dédiés pour partiel/reliquat (sinon on pioche via mode)
-                etat_a = partiel_etat_a or pick_etat()
-                etat_b = partiel_etat_b or pick_etat()
-                qte_a = partiel_qte
-                qte_b = qte_full - partiel_qte
-
-                lignes_export.append(build_line(etat_a, qte_a))
-                lignes_export.append(build_line(etat_b, qte_b))
-            else:
-                etat = pick_etat()
-                lignes_export.append(build_line(etat, qte_full))
-
-        if not lignes_export:
-            continue
-
-        df_export = pd.DataFrame(lignes_export)
-
-        # Nom de fichier
-        horodatage = datetime.now().strftime("%Y%m%d%H%M%S")
-        ref_for_name = details[0] if details else str(idx)
-        ref_for_name = re.sub(r'[^A-Za-z0-9._-]+', '_', ref_for_name)
-        fichier_nom = f"OU_EXP_{ref_for_name}_{horodatage}.csv"
-
-        # Buffer
-        buffer = BytesIO()
-        df_export = df_export.astype(str)
-        df_export.to_csv(buffer, sep=";", index=False, encoding="latin-1")
-        buffer.seek(0)
-
-        fichiers.append((fichier_nom, buffer))
-        commandes_generees += 1
-        num_commande += 1
-
-    return fichiers
-
-
-# =============================
-# Fonction upload SFTP
-# =============================
-def upload_sftp(fichiers, sftp_cfg):
-    host = sftp_cfg.get("host")
-    user = sftp_cfg.get("user")
-    pwd  = sftp_cfg.get("pass")
-    dir_remote = sftp_cfg.get("dir", "refonteTest")
-
-    if not host or not user or not pwd:
-        return False, "Identifiants SFTP manquants"
-
-    try:
-        transport = paramiko.Transport((host, 22))
-        transport.connect(username=user, password=pwd)
-        sftp = paramiko.SFTPClient.from_transport(transport)
-
-        for nom, buffer in fichiers:
-            buffer.seek(0)
-            remote_path = f"{dir_remote}/{nom}"
-            sftp.putfo(buffer, remote_path)
-            st.write(f"✅ Upload {remote_path}")
-
-        sftp.close()
-        transport.close()
-        return True, f"{len(fichiers)} fichier(s) envoyé(s) en SFTP vers {dir_remote}"
-    except Exception as e:
-        return False, str(e)
-
 # =============================
 # Interface Streamlit
 # =============================
@@ -292,8 +58,12 @@ if "sftp_ok" not in st.session_state:
     st.session_state.sftp_ok = False
 if "sftp_msg" not in st.session_state:
     st.session_state.sftp_msg = ""
-if "dernier_fichier" not in st.session_state:
-    st.session_state.dernier_fichier = None  # (name, BytesIO)
+if "dernier_lot" not in st.session_state:
+    st.session_state.dernier_lot = None  # identifiant du lot dans core.lots (fichiers sur disque)
+if "derniere_perf" not in st.session_state:
+    st.session_state.derniere_perf = None
+if "job_id" not in st.session_state:
+    st.session_state.job_id = None
 
 st.markdown("""
 ### 📑 Fichier source attendu (Export Commande → BOSS)
@@ -313,11 +83,25 @@ et choisir les états : *Commande validée* - *Commande en préparation*
 # Upload fichier source
 fichier_source = st.file_uploader("📂 Charger le fichier CSV source", type=["csv"])
 if fichier_source:
+    from core.source import (
+        SEUIL_STREAMING, apercu_source, charger_source, controler_source, iter_source_chunks, resume_validation
+    )
+
     try:
-        fichier_source.seek(0)  # 🔑 reset curseur
-        df_preview = pd.read_csv(fichier_source, sep=",", encoding="utf-8")
+        # Seules les 5 premières lignes sont lues : aperçu immédiat quelle que soit la taille
         st.markdown("### 👀 Aperçu du fichier source (5 premières lignes)")
-        st.dataframe(df_preview.head())
+        st.dataframe(apercu_source(fichier_source))
+
+        # Contrôle complet (par blocs, refait seulement si le contenu change)
+        rapport = controler_source(fichier_source)
+        problemes = resume_validation(rapport)
+        if problemes:
+            st.warning("⚠️ Fichier source à vérifier avant envoi :\n\n- " + "\n- ".join(problemes))
+            if rapport["exemples"]:
+                with st.expander("Exemples de lignes en cause"):
+                    st.code("\n".join(rapport["exemples"]), language=None)
+        else:
+            st.caption(f"✅ {rapport['lignes']} ligne(s) contrôlée(s), aucune anomalie")
     except Exception as e:
         st.error(f"Erreur lecture CSV: {e}")
 
@@ -335,6 +119,14 @@ mode_etat = {
     "Cyclique (1,2,3…)": "cyclique",
     "Aléatoire par ligne": "aleatoire"
 }[mode_etat_label]
+graine = None
+if mode_etat == "aleatoire":
+    graine_txt = st.text_input("🎲 Graine (optionnel, pour rejouer le même tirage)", value="").strip()
+    if graine_txt:
+        if not graine_txt.isdigit():
+            st.error("La graine doit être un entier positif.")
+            st.stop()
+        graine = int(graine_txt)
 
 # Gestion des lignes partielles
 with st.expander("✂️ Gestion de ligne partielle"):
@@ -354,6 +146,44 @@ with st.expander("✂️ Gestion de ligne partielle"):
         else:
             st.warning("Sélectionne au moins un état pour configurer la ligne partielle.")
 
+# Archive du lot
+with st.expander("🗜️ Archive du lot"):
+    archive_active = st.checkbox("Générer une archive de tout le lot (téléchargement)", value=False)
+    archive_format = "zip"
+    archive_seule = False
+    if archive_active:
+        archive_format = st.radio("Format de l'archive", list(FORMATS), index=0, horizontal=True)
+        archive_seule = st.checkbox(
+            "Envoyer uniquement l'archive en SFTP (un seul fichier au lieu d'un par commande)",
+            value=False
+        )
+
+# Génération multi-processus
+with st.expander("⚙️ Génération parallèle"):
+    processus = st.number_input(
+        "Nombre de processus pour la génération des fichiers (1 = séquentiel)",
+        min_value=1, max_value=os.cpu_count() or 1, value=1, step=1
+    )
+
+# Envoi incrémental
+with st.expander("🔁 Envoi incrémental"):
+    delta_active = st.checkbox(
+        "N'envoyer que les commandes nouvelles ou modifiées depuis le dernier envoi vers ce SFTP",
+        value=False
+    )
+    if delta_active and fichier_source and fichier_source.size <= SEUIL_STREAMING:
+        # Pré-contrôle : le CSV est parsé une fois puis gardé en cache pour l'envoi
+        from core.historique import HistoriqueEnvois
+
+        try:
+            compte = HistoriqueEnvois(cible=cible_sftp(SFTP_CFG)).compter(charger_source(fichier_source))
+            st.caption(
+                f"{compte['nouvelle']} nouvelle(s), {compte['modifiee']} modifiée(s), "
+                f"{compte['envoyee']} déjà envoyée(s) (ignorées)"
+            )
+        except Exception as e:
+            st.warning(f"Historique des envois indisponible : {e}")
+
 # Transporteurs & limites
 transporteurs_selectionnes = st.multiselect(
     "🚚 Choisir les transporteurs :", [t["nom"] for t in TRANSPORTEURS]
@@ -365,7 +195,8 @@ if st.button("▶️ Générer et envoyer sur SFTP", type="primary"):
     # Reset état d’exécution précédent
     st.session_state.sftp_ok = False
     st.session_state.sftp_msg = ""
-    st.session_state.dernier_fichier = None
+    st.session_state.dernier_lot = None
+    st.session_state.derniere_perf = None
 
     # Validations
     if not fichier_source:
@@ -378,10 +209,15 @@ if st.button("▶️ Générer et envoyer sur SFTP", type="primary"):
         st.error("Merci de choisir au moins un transporteur.")
         st.stop()
 
-    # Lecture effective du CSV
+    # Lecture effective du CSV (cache : parsé une fois par contenu ;
+    # gros export : blocs passés directement à la génération)
     try:
-        fichier_source.seek(0)
-        df = pd.read_csv(fichier_source, sep=",", encoding="utf-8")
+        t_lecture = time.perf_counter()
+        if fichier_source.size > SEUIL_STREAMING:
+            df = iter_source_chunks(fichier_source)
+        else:
+            df = charger_source(fichier_source)
+        lecture = (time.perf_counter() - t_lecture, fichier_source.size)
     except Exception as e:
         st.error(f"Erreur lecture CSV: {e}")
         st.stop()
@@ -392,9 +228,8 @@ if st.button("▶️ Générer et envoyer sur SFTP", type="primary"):
         st.error("Aucun transporteur valide après filtrage.")
         st.stop()
 
-    # Génération
-    fichiers = generer_csv_par_commande(
-        df=df,
+    # Génération + envoi soumis en tâche de fond : la page rend la main tout de suite
+    options = dict(
         etats=etats_selectionnes,
         transporteurs=transporteurs_utilises,
         mode_etat=mode_etat,
@@ -402,44 +237,127 @@ if st.button("▶️ Générer et envoyer sur SFTP", type="primary"):
         partiel_active=partiel_active,
         partiel_qte=partiel_qte,
         partiel_etat_a=etat_partiel_a,
-        partiel_etat_b=etat_partiel_b
+        partiel_etat_b=etat_partiel_b,
+        processus=processus,
+        graine=graine
     )
-
-    if not fichiers:
-        st.warning("Aucune ligne valide à exporter (vérifie le fichier source).")
-        st.stop()
-
-    st.info(f"{len(fichiers)} fichier(s) généré(s), tentative d'envoi SFTP...")
-
-    # Envoi SFTP
-    ok, msg = upload_sftp(fichiers, SFTP_CFG)  # <- ok et msg TOUJOURS définis ici
-    st.session_state.sftp_ok = bool(ok)
-    st.session_state.sftp_msg = msg or ""
-    # Mémoriser le 1er fichier pour le téléchargement
-    try:
-        st.session_state.dernier_fichier = fichiers[0]
-    except Exception:
-        st.session_state.dernier_fichier = None
-
-    # Feedback immédiat
-    if st.session_state.sftp_ok:
-        st.success(st.session_state.sftp_msg)
+    from core.pipeline import envoyer_commandes
+    historique = None
+    if delta_active:
+        from core.historique import HistoriqueEnvois
+        historique = HistoriqueEnvois(cible=cible_sftp(SFTP_CFG))
+
+    job = get_runner().soumettre(
+        lambda job: envoyer_commandes(
+            df, options, SFTP_CFG,
+            archive_format=archive_format if archive_active else None,
+            archive_seule=archive_seule,
+            lecture=lecture,
+            historique=historique,
+            progression=job.avancer,
+            lot=get_magasin().nouveau_lot()
+        ),
+        description=fichier_source.name
+    )
+    st.session_state.job_id = job.id
+    st.query_params["job"] = job.id  # permet de retrouver le job après reconnexion
+    st.rerun()
+
+# ---- Suivi du job en cours ----
+if st.session_state.job_id is None and "job" in st.query_params:
+    st.session_state.job_id = st.query_params["job"]
+
+if st.session_state.job_id is not None:
+    job = get_runner().job(st.session_state.job_id)
+    if job is None:
+        st.session_state.job_id = None
+        st.query_params.pop("job", None)
+    elif not job.termine:
+        etat = job.instantane()
+        st.info(
+            f"⏳ Envoi en cours ({etat['description']}) : {etat['fichiers_ok']} fichier(s) envoyé(s)"
+            + (f", {etat['fichiers_erreur']} en échec" if etat["fichiers_erreur"] else "")
+            + (f" — {etat['fichiers_par_s']} fichiers/s" if etat["fichiers_par_s"] else "")
+            + f" — {etat['secondes']} s"
+        )
+        time.sleep(1)
+        st.rerun()
     else:
-        st.error("❌ Erreur SFTP : " + st.session_state.sftp_msg)
+        # Job terminé : résultat recopié dans la session, affiché une seule fois
+        get_runner().retirer(job.id)
+        st.session_state.job_id = None
+        st.query_params.pop("job", None)
+        if job.erreur is not None:
+            st.session_state.sftp_msg = job.erreur
+            st.error(f"Erreur génération: {job.erreur}")
+        elif job.resultat.get("vide"):
+            st.warning(job.resultat["msg"])
+        else:
+            res = job.resultat
+            st.session_state.sftp_ok = res["ok"]
+            st.session_state.sftp_msg = res["msg"]
+            st.session_state.dernier_lot = res.get("lot")
+            st.session_state.derniere_perf = res["perf"]
+            if res.get("avertissement"):
+                st.warning(res["avertissement"])
+
+            # Résumé du lot
+            if st.session_state.sftp_ok:
+                st.success(st.session_state.sftp_msg)
+            else:
+                st.error("❌ Erreur SFTP : " + st.session_state.sftp_msg)
 
 # ---- Zone de sortie (bas de page) ----
-# Bouton de téléchargement (si un fichier est dispo)
-if st.session_state.dernier_fichier is not None:
-    nom, buffer = st.session_state.dernier_fichier
-    try:
+# Mesures du dernier envoi
+if st.session_state.derniere_perf is not None:
+    perf = st.session_state.derniere_perf
+    with st.expander("⏱️ Performance"):
+        st.caption(
+            f"Durée totale : {perf['wall_seconds']} s — {perf['files_sent']} fichier(s) envoyé(s)"
+            + (f" — {perf['files_per_s']} fichiers/s" if perf["files_per_s"] else "")
+        )
+        st.dataframe(perf["stages"], width="stretch")
+
+# Téléchargements : fichiers relus sur disque au clic seulement
+if st.session_state.dernier_lot is not None:
+    magasin = get_magasin()
+    lot_id = st.session_state.dernier_lot
+    infos = magasin.infos(lot_id)
+    if infos is None:
+        st.info("Le lot généré a expiré : plus de téléchargement disponible.")
+        st.session_state.dernier_lot = None
+    elif infos["fichiers"]:
+        noms = infos["fichiers"]
+        nom = noms[0] if len(noms) == 1 else st.selectbox(
+            f"📄 Fichier à télécharger ({len(noms)} dans le lot)", noms, key="fichier_lot"
+        )
         st.download_button(
-            "⬇️ Télécharger le 1er fichier généré",
-            buffer,
+            "⬇️ Télécharger le fichier",
+            lambda nom=nom: magasin.lire(lot_id, nom),
             file_name=nom,
+            mime="text/csv",
+            on_click="ignore",
             key="download_1"
         )
-    except Exception:
-        st.info("Les fichiers ont été envoyés en SFTP. Aucun téléchargement local n'a été créé.")
+
+        # Lot complet : archive demandée au moment de l'envoi, sinon ZIP construit au clic
+        if infos["archive"]:
+            st.download_button(
+                "⬇️ Télécharger l'archive du lot",
+                lambda: magasin.lire(lot_id, infos["archive"]),
+                file_name=infos["archive"],
+                on_click="ignore",
+                key="download_archive"
+            )
+        else:
+            st.download_button(
+                "⬇️ Télécharger tout le lot (ZIP)",
+                lambda: magasin.lire_zip(lot_id),
+                file_name=f"OU_EXP_LOT_{lot_id}.zip",
+                mime="application/zip",
+                on_click="ignore",
+                key="download_archive"
+            )
 
 # Bouton CRON (uniquement si SFTP OK) — affiché APRÈS le téléchargement
 if st.session_state.sftp_ok:
@@ -450,5 +368,5 @@ if st.session_state.sftp_ok:
     st.link_button(
         "✅ Lancer la CRON MistralRecupCommande",
         CRON_URL,
-        use_container_width=True
+        width="stretch"
     )
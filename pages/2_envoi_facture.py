@@ -2,69 +2,12 @@
 # -*- coding: utf-8 -*-
 
 import streamlit as st
-from io import BytesIO
-from datetime import datetime
-import os
-import paramiko
 
-# =============================
-# Config SFTP (identique à ta 1re page)
-# =============================
-def get_sftp_config():
-    try:
-        sftp_conf = st.secrets["sftp"]
-        return {
-            "host": sftp_conf.get("host"),
-            "user": sftp_conf.get("user"),
-            "pass": sftp_conf.get("pass"),
-            "dir":  sftp_conf.get("dir", "refonteTest")
-        }
-    except Exception:
-        return {
-            "host": os.environ.get("SFTP_HOST"),
-            "user": os.environ.get("SFTP_USER"),
-            "pass": os.environ.get("SFTP_PASS"),
-            "dir":  os.environ.get("SFTP_DIR", "refonteTest")
-        }
-
-SFTP_CFG = get_sftp_config()
-
-def upload_sftp_blobs(named_blobs, sftp_cfg):
-    """
-    named_blobs: liste de tuples (remote_filename, BytesIO)
-    """
-    host = sftp_cfg.get("host")
-    user = sftp_cfg.get("user")
-    pwd  = sftp_cfg.get("pass")
-    dir_remote = sftp_cfg.get("dir", "refonteTest")
-
-    if not host or not user or not pwd:
-        return False, "Identifiants SFTP manquants"
-
-    try:
-        transport = paramiko.Transport((host, 22))
-        transport.connect(username=user, password=pwd)
-        sftp = paramiko.SFTPClient.from_transport(transport)
-
-        # s'assure que le dir existe (best effort)
-        try:
-            sftp.listdir(dir_remote)
-        except IOError:
-            try:
-                sftp.mkdir(dir_remote)
-            except Exception:
-                pass
-
-        for nom, buffer in named_blobs:
-            buffer.seek(0)
-            remote_path = f"{dir_remote}/{nom}"
-            sftp.putfo(buffer, remote_path)
-
-        sftp.close()
-        transport.close()
-        return True, f"{len(named_blobs)} fichier(s) envoyé(s) sur {dir_remote}"
-    except Exception as e:
-        return False, str(e)
+from core.config import get_sftp_config
+from core.factures import SourcesPDF, apparier, envoyer_facture, envoyer_lot_factures, lire_correspondance
+from core.metrics import Mesures
+
+SFTP_CFG = get_sftp_config(st.secrets)
 
 # =============================
 # UI
@@ -78,71 +21,150 @@ if "facture_msg" not in st.session_state:
     st.session_state.facture_msg = ""
 if "dernier_pdf_nom" not in st.session_state:
     st.session_state.dernier_pdf_nom = None
+if "derniere_perf_facture" not in st.session_state:
+    st.session_state.derniere_perf_facture = None
 
 st.markdown("""
 Cette page permet de déposer une facture PDF reliée à une commande, puis de
 générer le **fichier de contrôle** attendu par le traitement BOSS, et d'envoyer le tout en **SFTP**.
 """)
 
-col1, col2 = st.columns(2)
-with col1:
-    num_commande = st.text_input("🧩 Numéro de commande", placeholder="Ex : 4753073")
-with col2:
-    num_facture = st.text_input("🧾 Numéro de facture", placeholder="Ex : F2025-00123")
-
-pdf_file = st.file_uploader("📄 Charger le PDF de la facture", type=["pdf"])
-
-# Bouton d'envoi
-if st.button("📤 Envoyer la facture sur SFTP", type="primary"):
-    st.session_state.facture_ok = False
-    st.session_state.facture_msg = ""
-    st.session_state.dernier_pdf_nom = None
-
-    # Validations
-    if not num_commande.strip():
-        st.error("Merci de saisir un **numéro de commande**.")
-        st.stop()
-    if not num_facture.strip():
-        st.error("Merci de saisir un **numéro de facture**.")
-        st.stop()
-    if pdf_file is None:
-        st.error("Merci de charger un **fichier PDF**.")
-        st.stop()
-
-    # Date du jour
-    today = datetime.now().strftime("%Y%m%d")
-
-    # Nom du PDF renommé
-    pdf_remote_name = f"FACT_{num_commande}_{today}_{num_facture}.pdf"
-
-    # Nom du fichier de contrôle (sans extension)
-    # Contenu attendu : "numcommande;nomfichieravecext"
-    ctrl_remote_name = f"OU_FACT_{num_commande}_{today}_{num_facture}"
-    ctrl_content = f"{num_commande};{pdf_remote_name}"
-
-    # Prépare les blobs en mémoire
-    # 1) PDF renommé
-    pdf_bytes = pdf_file.read()
-    pdf_blob = BytesIO(pdf_bytes)
-
-    # 2) Fichier de contrôle (texte)
-    ctrl_blob = BytesIO(ctrl_content.encode("latin-1", errors="ignore"))
-
-    # Envoi SFTP des 2 fichiers
-    ok, msg = upload_sftp_blobs(
-        [(pdf_remote_name, pdf_blob), (ctrl_remote_name, ctrl_blob)],
-        SFTP_CFG
+mode_envoi = st.radio(
+    "Mode d'envoi",
+    ["Facture unique", "Lot (plusieurs PDF ou ZIP + correspondance)"],
+    index=0, horizontal=True
+)
+
+if mode_envoi == "Facture unique":
+    col1, col2 = st.columns(2)
+    with col1:
+        num_commande = st.text_input("🧩 Numéro de commande", placeholder="Ex : 4753073")
+    with col2:
+        num_facture = st.text_input("🧾 Numéro de facture", placeholder="Ex : F2025-00123")
+
+    pdf_file = st.file_uploader("📄 Charger le PDF de la facture", type=["pdf"])
+
+    # Bouton d'envoi
+    if st.button("📤 Envoyer la facture sur SFTP", type="primary"):
+        st.session_state.facture_ok = False
+        st.session_state.facture_msg = ""
+        st.session_state.dernier_pdf_nom = None
+        st.session_state.derniere_perf_facture = None
+        mesures = Mesures("envoi_facture")
+
+        # Validations
+        if not num_commande.strip():
+            st.error("Merci de saisir un **numéro de commande**.")
+            st.stop()
+        if not num_facture.strip():
+            st.error("Merci de saisir un **numéro de facture**.")
+            st.stop()
+        if pdf_file is None:
+            st.error("Merci de charger un **fichier PDF**.")
+            st.stop()
+
+        # PDF renommé + fichier de contrôle (sans extension), envoyés ensemble ;
+        # le PDF est lu directement dans le buffer de l'upload (pas de copie)
+        with mesures.chrono("upload_sftp_blobs"):
+            ok, msg, (pdf_remote_name, ctrl_remote_name, ctrl_content) = envoyer_facture(
+                num_commande, num_facture, pdf_file, SFTP_CFG, mesures
+            )
+        st.session_state.facture_ok = bool(ok)
+        st.session_state.facture_msg = msg
+        st.session_state.dernier_pdf_nom = pdf_remote_name if ok else None
+        st.session_state.derniere_perf_facture = mesures.resume()
+        try:
+            mesures.ecrire_jsonl()
+        except OSError as e:
+            st.warning(f"Journal de métriques non écrit : {e}")
+
+        if ok:
+            st.success(msg)
+            st.info(f"PDF renommé : **{pdf_remote_name}**")
+            st.info(f"Fichier contrôle : **{ctrl_remote_name}** (contenu : `{ctrl_content}`)")
+        else:
+            st.error("❌ Erreur SFTP : " + msg)
+
+else:
+    st.markdown("""
+Charger les PDF (ou un **ZIP** de PDF) et un CSV de correspondance `commande;facture`.
+Le PDF de chaque ligne est retrouvé par son nom : `<facture>.pdf`, sinon `<commande>.pdf`,
+ou le nom donné en 3e colonne (`commande;facture;fichier.pdf`).
+""")
+    pdf_files = st.file_uploader(
+        "📄 Charger les PDF ou un ZIP", type=["pdf", "zip"], accept_multiple_files=True
     )
-    st.session_state.facture_ok = bool(ok)
-    st.session_state.facture_msg = msg
-    st.session_state.dernier_pdf_nom = pdf_remote_name if ok else None
+    csv_correspondance = st.file_uploader("🔗 CSV de correspondance (commande;facture)", type=["csv", "txt"])
 
-    if ok:
-        st.success(msg)
-        st.info(f"PDF renommé : **{pdf_remote_name}**")
-        st.info(f"Fichier contrôle : **{ctrl_remote_name}** (contenu : `{ctrl_content}`)")
-    else:
-        st.error("❌ Erreur SFTP : " + msg)
+    paires, manquants = [], []
+    if pdf_files and csv_correspondance is not None:
+        try:
+            correspondance = lire_correspondance(csv_correspondance)
+            sources = SourcesPDF(pdf_files)
+            paires, manquants = apparier(correspondance, sources)
+            sources.fermer()
+            st.caption(
+                f"{len(paires)} facture(s) prête(s) sur {len(correspondance)} ligne(s) — "
+                f"{len(sources)} PDF chargé(s)"
+            )
+            if paires:
+                st.dataframe(
+                    [{"commande": p["commande"], "facture": p["facture"], "pdf": p["source"],
+                      "envoyé sous": p["pdf_remote_name"]} for p in paires[:200]],
+                    width="stretch"
+                )
+            if manquants:
+                st.warning(
+                    f"{len(manquants)} ligne(s) sans PDF correspondant : "
+                    + ", ".join(f"{m['commande']};{m['facture']}" for m in manquants[:10])
+                    + (" …" if len(manquants) > 10 else "")
+                )
+        except Exception as e:
+            st.error(f"Erreur lecture du lot : {e}")
+
+    if st.button("📤 Envoyer le lot de factures sur SFTP", type="primary"):
+        st.session_state.facture_ok = False
+        st.session_state.facture_msg = ""
+        st.session_state.dernier_pdf_nom = None
+        st.session_state.derniere_perf_facture = None
+        mesures = Mesures("envoi_facture_lot")
+
+        if not paires:
+            st.error("Aucune facture à envoyer (vérifie les PDF et le CSV de correspondance).")
+            st.stop()
+
+        # Les sources sont rouvertes pour l'envoi (membres de ZIP lus en flux)
+        sources = SourcesPDF(pdf_files)
+        barre = st.progress(0.0)
+        nb_fichiers = 2 * len(paires)
+        traites = [0]
+
+        def progression(ok, nom):
+            traites[0] += 1
+            barre.progress(min(traites[0] / nb_fichiers, 1.0), text=f"{traites[0]}/{nb_fichiers} : {nom}")
+
+        with mesures.chrono("upload_lot_factures"):
+            ok, msg, envoyees = envoyer_lot_factures(paires, sources, SFTP_CFG, mesures, progression)
+        st.session_state.facture_ok = bool(ok)
+        st.session_state.facture_msg = msg
+        st.session_state.dernier_pdf_nom = envoyees[-1]["pdf_remote_name"] if envoyees else None
+        st.session_state.derniere_perf_facture = mesures.resume()
+        try:
+            mesures.ecrire_jsonl()
+        except OSError as e:
+            st.warning(f"Journal de métriques non écrit : {e}")
+
+        if ok:
+            st.success(msg)
+        else:
+            st.error("❌ Erreur SFTP : " + msg)
+
+# Mesures du dernier envoi
+if st.session_state.derniere_perf_facture is not None:
+    perf = st.session_state.derniere_perf_facture
+    with st.expander("⏱️ Performance"):
+        st.caption(f"Durée totale : {perf['wall_seconds']} s — {perf['files_sent']} fichier(s) envoyé(s)")
+        st.dataframe(perf["stages"], width="stretch")
 
 st.markdown("---")
 
@@ -159,5 +181,5 @@ if st.session_state.facture_ok:
     st.link_button(
         "✅ Ouvrir la cron MistralRecupFacture (login LDAP)",
         CRON_FACTURE_URL,
-        use_container_width=True
+        width="stretch"
     )
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Reprise d'un lot OU_EXP partiellement en échec, contre le serveur SFTP local
+(benchmarks.sftp_stub) : la relance ne doit renvoyer que ce qui manque.
+"""
+
+import os
+import re
+from io import BytesIO
+
+import pytest
+
+import core.sftp
+from benchmarks.bench_pipeline import export_synthetique
+from benchmarks.sftp_stub import SFTPStub
+from core.generation import iter_csv_par_commande
+from core.manifeste import Manifeste
+from core.referentiel import ETATS, TRANSPORTEURS
+from core.sftp import cible_sftp, envoyer_lot
+from core.source import lire_source
+
+
+@pytest.fixture
+def stub(tmp_path):
+    (tmp_path / "sftp").mkdir()
+    serveur = SFTPStub(str(tmp_path / "sftp"))
+    yield serveur
+    serveur.close()
+
+
+def _lot(horodatage):
+    # Même lot régénéré : seul l'horodatage des noms change
+    df = lire_source(BytesIO(export_synthetique(20, 3)))
+    return [
+        (re.sub(r"_\d{14}\.csv$", f"_{horodatage}.csv", nom), buffer)
+        for nom, buffer in iter_csv_par_commande(df, etats=ETATS, transporteurs=TRANSPORTEURS,
+                                                 mode_etat="cyclique")
+    ]
+
+
+def test_relance_lot_partiel_sans_doublon(stub, tmp_path, monkeypatch):
+    cfg = stub.sftp_cfg("refonteTest", retries=0)
+    dossier = os.path.join(str(tmp_path / "sftp"), "refonteTest")
+
+    def manifeste():
+        return Manifeste(cible_sftp(cfg), dossier=str(tmp_path / "manifestes"))
+
+    # 1er envoi : un fichier échoue, les 19 autres sont validés
+    lot = _lot("20260101080000")
+    en_echec = lot[7][0]
+    put = core.sftp._put_with_retry
+
+    def put_casse(pool, buffer, remote_path, *args, **kwargs):
+        if en_echec in remote_path:
+            return IOError("coupure réseau")
+        return put(pool, buffer, remote_path, *args, **kwargs)
+
+    monkeypatch.setattr(core.sftp, "_put_with_retry", put_casse)
+    ok, _, valides = envoyer_lot(lot, cfg, manifeste=manifeste())
+    assert not ok and len(valides) == 19
+
+    # Relance : le lot est régénéré (nouvel horodatage), seul le fichier manquant part
+    envois = []
+
+    def put_compte(pool, buffer, remote_path, *args, **kwargs):
+        envois.append(remote_path)
+        return put(pool, buffer, remote_path, *args, **kwargs)
+
+    monkeypatch.setattr(core.sftp, "_put_with_retry", put_compte)
+    ok, _, valides = envoyer_lot(_lot("20260101081500"), cfg, manifeste=manifeste())
+    assert ok and len(valides) == 20
+    assert len(envois) == 1
+
+    # Une commande = un fichier sur le serveur, aucun temporaire restant
+    fichiers = os.listdir(dossier)
+    assert not [f for f in fichiers if f.endswith(".part")]
+    refs = [re.sub(r"_\d{14}\.csv$", "", f) for f in fichiers]
+    assert len(fichiers) == 20 and len(set(refs)) == 20